@@ -0,0 +1,44 @@
+from django.conf                import settings
+from django.core.handlers.asgi import ASGIHandler
+
+from core.http import JsonResponse
+
+class BodyTooLarge(Exception):
+    pass
+
+class BoundedASGIHandler(ASGIHandler):
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self.content_length(scope) > settings.UPLOAD_MAX_SIZE:
+            return await self.reject(send)
+
+        try:
+            await super().__call__(scope, receive, send)
+        except BodyTooLarge:
+            await self.reject(send)
+
+    async def read_body(self, receive):
+        received = 0
+
+        async def bounded_receive():
+            nonlocal received
+            message   = await receive()
+            received += len(message.get("body", b""))
+            if received > settings.UPLOAD_MAX_SIZE:
+                raise BodyTooLarge()
+            return message
+
+        return await super().read_body(bounded_receive)
+
+    def content_length(self, scope):
+        for name, value in scope.get("headers", []):
+            if name.lower() == b"content-length":
+                try:
+                    return int(value)
+                except ValueError:
+                    return 0
+        return 0
+
+    async def reject(self, send):
+        response = JsonResponse({"MESSAGE" : "FILE_TOO_LARGE"}, status=400)
+        response["Connection"] = "close"
+        await self.send_response(response, send)
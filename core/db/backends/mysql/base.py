@@ -0,0 +1,50 @@
+import threading
+
+from django.conf              import settings
+from django.db.backends.mysql import base as mysql
+from functools                import partial
+
+from core.db.pool import ConnectionPool, PoolTimeout
+
+Database = mysql.Database
+
+pools      = {}
+pools_lock = threading.Lock()
+
+def ping(connection):
+    connection.ping(reconnect=False)
+    return True
+
+def get_pool(alias, settings_dict, create):
+    with pools_lock:
+        if alias not in pools:
+            options      = {**settings.DATABASE_POOL, **settings_dict.get("POOL", {})}
+            pools[alias] = ConnectionPool(
+                alias, create, close=lambda connection: connection.close(), check=ping,
+                **{key.lower() : value for key, value in options.items()}
+            )
+        return pools[alias]
+
+class DatabaseWrapper(mysql.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(self.alias, self.settings_dict, partial(super().get_new_connection, conn_params))
+        try:
+            return self.pool.acquire()
+        except PoolTimeout as error:
+            raise Database.OperationalError(str(error)) from error
+
+    def init_connection_state(self):
+        if self.pool.checkouts(self.connection) == 1:
+            super().init_connection_state()
+
+    def _close(self):
+        if self.connection is None:
+            return
+
+        discard = self.in_atomic_block or self.errors_occurred
+        if not discard and not self.autocommit:
+            try:
+                self.connection.rollback()
+            except Database.Error:
+                discard = True
+        self.pool.release(self.connection, discard=discard)
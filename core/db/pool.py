@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+
+from collections import deque
+
+from core.metrics import DB_POOL_CHECKED_OUT, DB_POOL_CONNECTIONS, DB_POOL_WAITS, DB_POOL_WAIT_DURATION
+
+class PoolTimeout(Exception):
+    pass
+
+class PooledConnection:
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.used_at    = self.created_at
+        self.checkouts  = 0
+
+class ConnectionPool:
+    def __init__(self, name, create, close, check=None, max_size=10, max_lifetime=1800, max_idle=300, timeout=5, check_after=1):
+        self.name         = name
+        self.create       = create
+        self.close        = close
+        self.check        = check
+        self.max_size     = max_size
+        self.max_lifetime = max_lifetime
+        self.max_idle     = max_idle
+        self.timeout      = timeout
+        self.check_after  = check_after
+        self.condition    = threading.Condition()
+        self.reset()
+
+    def reset(self):
+        self.pid         = os.getpid()
+        self.idle        = deque()
+        self.checked_out = {}
+        self.size        = 0
+        self.waits       = 0
+        self.wait_time   = 0.0
+
+    def acquire(self):
+        start = time.monotonic()
+        while True:
+            entry, stale = self.take(start)
+            for old in stale:
+                self.discard(old)
+
+            if entry is None:
+                entry = self.connect()
+            elif time.monotonic() - entry.created_at >= self.max_lifetime or not self.is_healthy(entry):
+                self.forget(entry)
+                continue
+
+            with self.condition:
+                entry.checkouts += 1
+                self.checked_out[id(entry.connection)] = entry
+                self.publish()
+            return entry.connection
+
+    def take(self, start):
+        waited, stale = False, []
+        with self.condition:
+            if self.pid != os.getpid():
+                self.reset()
+
+            while True:
+                stale += self.reap()
+                if self.idle:
+                    entry = self.idle.pop()
+                    break
+                if self.size < self.max_size:
+                    self.size += 1
+                    entry = None
+                    break
+
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    raise PoolTimeout(f"No connection free in pool {self.name!r} after {self.timeout}s ({self.max_size} in use)")
+                waited = True
+                self.condition.wait(remaining)
+
+            if waited:
+                elapsed         = time.monotonic() - start
+                self.waits     += 1
+                self.wait_time += elapsed
+                DB_POOL_WAITS.labels(self.name).inc()
+                DB_POOL_WAIT_DURATION.labels(self.name).observe(elapsed)
+            self.publish()
+        return entry, stale
+
+    def reap(self):
+        now   = time.monotonic()
+        stale = []
+        while self.idle and (now - self.idle[0].used_at >= self.max_idle or now - self.idle[0].created_at >= self.max_lifetime):
+            stale.append(self.idle.popleft())
+            self.size -= 1
+        return stale
+
+    def connect(self):
+        try:
+            return PooledConnection(self.create())
+        except BaseException:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+                self.publish()
+            raise
+
+    def is_healthy(self, entry):
+        if self.check is None or time.monotonic() - entry.used_at < self.check_after:
+            return True
+        try:
+            return self.check(entry.connection)
+        except Exception:
+            return False
+
+    def release(self, connection, discard=False):
+        with self.condition:
+            entry = self.checked_out.pop(id(connection), None)
+            if entry is None:
+                return
+
+            discard = discard or time.monotonic() - entry.created_at >= self.max_lifetime
+            if discard:
+                self.size -= 1
+            else:
+                entry.used_at = time.monotonic()
+                self.idle.append(entry)
+            self.condition.notify()
+            self.publish()
+
+        if discard:
+            self.discard(entry)
+
+    def checkouts(self, connection):
+        entry = self.checked_out.get(id(connection))
+        return entry.checkouts if entry else 0
+
+    def forget(self, entry):
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+            self.publish()
+        self.discard(entry)
+
+    def discard(self, entry):
+        try:
+            self.close(entry.connection)
+        except Exception:
+            pass
+
+    def clear(self):
+        with self.condition:
+            idle, self.idle = list(self.idle), deque()
+            self.size      -= len(idle)
+            self.condition.notify_all()
+            self.publish()
+        for entry in idle:
+            self.discard(entry)
+
+    def publish(self):
+        DB_POOL_CONNECTIONS.labels(self.name).set(self.size)
+        DB_POOL_CHECKED_OUT.labels(self.name).set(len(self.checked_out))
+
+    def stats(self):
+        with self.condition:
+            return {
+                "size"         : self.size,
+                "idle"         : len(self.idle),
+                "checked_out"  : len(self.checked_out),
+                "waits"        : self.waits,
+                "wait_time_ms" : round(self.wait_time * 1000, 3),
+            }
@@ -0,0 +1,33 @@
+import random
+
+from contextlib  import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db   import DEFAULT_DB_ALIAS, connections
+
+read_database = ContextVar("read_database", default=None)
+
+@contextmanager
+def primary_reads():
+    token = read_database.set(DEFAULT_DB_ALIAS)
+    try:
+        yield
+    finally:
+        read_database.reset(token)
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return read_database.get() or random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        return (obj1._state.db in databases and obj2._state.db in databases) or None
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
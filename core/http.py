@@ -0,0 +1,44 @@
+import json
+
+from django.conf                  import settings
+from django.core.exceptions       import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http                  import HttpResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+django_encoder = DjangoJSONEncoder()
+
+def django_default(obj):
+    return django_encoder.default(obj)
+
+def stdlib_dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+def orjson_dumps(data):
+    return orjson.dumps(data, default=django_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+JSON_BACKENDS = {
+    "json"   : stdlib_dumps,
+    "orjson" : orjson_dumps,
+}
+
+def get_json_dumps(backend=None):
+    backend = backend or settings.JSON_RESPONSE_BACKEND
+    if backend not in JSON_BACKENDS:
+        raise ImproperlyConfigured(f"Unknown JSON_RESPONSE_BACKEND {backend!r}")
+
+    if backend == "orjson" and orjson is None:
+        backend = "json"
+    return JSON_BACKENDS[backend]
+
+class JsonResponse(HttpResponse):
+    def __init__(self, data, safe=True, backend=None, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=get_json_dumps(backend)(data), **kwargs)
@@ -0,0 +1,84 @@
+import io
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from django.conf        import settings
+from django.core.cache  import cache
+from django.db          import connections
+from django.dispatch    import Signal
+from PIL                import Image, ImageOps
+
+from core.metrics import S3_UPLOAD_DURATION, timed
+from core.utils   import get_s3_client
+from my_settings  import AWS_IAM_ACCESS_KEY_ID, AWS_IAM_SECRET_ACCESS_KEY, AWS_S3_STORAGE_BUCKET_NAME, AWS_S3_BUCKET_URL, AWS_LOGGER_NAME
+
+logger   = logging.getLogger(AWS_LOGGER_NAME)
+executor = ThreadPoolExecutor(max_workers=settings.IMAGE_DERIVATIVE_WORKERS, thread_name_prefix="image-derivatives")
+pending  = threading.BoundedSemaphore(settings.IMAGE_DERIVATIVE_QUEUE_SIZE)
+
+derivatives_created = Signal()
+
+def derivative_key(key, variant):
+    return f"derivatives/{variant}/{key.rsplit('.', 1)[0]}.webp"
+
+def derivative_url(url, variant="thumbnail"):
+    if not url or not url.startswith(AWS_S3_BUCKET_URL):
+        return url
+    return AWS_S3_BUCKET_URL + derivative_key(url[len(AWS_S3_BUCKET_URL):], variant)
+
+def ready_key(key):
+    return f"image-derivatives:{key}"
+
+def thumbnail_url(url):
+    if derivative_url(url) != url and cache.get(ready_key(url[len(AWS_S3_BUCKET_URL):])):
+        return derivative_url(url)
+    return url
+
+def create_derivatives(key):
+    s3_client = get_s3_client(AWS_IAM_ACCESS_KEY_ID, AWS_IAM_SECRET_ACCESS_KEY)
+    original  = s3_client.get_object(Bucket=AWS_S3_STORAGE_BUCKET_NAME, Key=key)["Body"].read()
+
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(original)))
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    for variant, size in settings.IMAGE_DERIVATIVE_SIZES.items():
+        derivative = image.copy()
+        if size:
+            derivative.thumbnail(size)
+
+        buffer = io.BytesIO()
+        derivative.save(buffer, "WEBP", quality=settings.IMAGE_DERIVATIVE_QUALITY)
+        with timed(S3_UPLOAD_DURATION, operation="derivative"):
+            s3_client.put_object(
+                Bucket       = AWS_S3_STORAGE_BUCKET_NAME,
+                Key          = derivative_key(key, variant),
+                Body         = buffer.getvalue(),
+                ContentType  = "image/webp",
+                CacheControl = settings.AWS_S3_CACHE_CONTROL
+            )
+
+def build_derivatives(key):
+    create_derivatives(key)
+    cache.set(ready_key(key), True, settings.IMAGE_DERIVATIVE_READY_TIMEOUT)
+    derivatives_created.send(sender=None, key=key, url=AWS_S3_BUCKET_URL + key)
+
+def derivative_job(key):
+    try:
+        build_derivatives(key)
+    finally:
+        connections.close_all()
+
+def finish(future):
+    pending.release()
+    if future.exception():
+        logger.error("image derivatives failed", exc_info=future.exception())
+
+def queue_derivatives(key):
+    if not pending.acquire(blocking=False):
+        logger.warning("image derivative queue is full, keeping the original of %s", key)
+        return False
+
+    executor.submit(derivative_job, key).add_done_callback(finish)
+    return True
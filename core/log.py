@@ -0,0 +1,137 @@
+import atexit
+import threading
+import time
+import watchtower
+
+from boto3.session               import Session
+from collections                 import deque
+from django.utils.module_loading import import_string
+from logging.handlers            import QueueHandler
+
+from core.metrics import LOG_RECORDS_DROPPED
+from my_settings  import AWS_IAM_ACCESS_KEY_ID, AWS_IAM_SECRET_ACCESS_KEY, AWS_REGION_NAME
+
+class DropOldestQueue:
+    def __init__(self, capacity):
+        self.capacity  = capacity
+        self.records   = deque()
+        self.dropped   = 0
+        self.condition = threading.Condition()
+
+    def put_nowait(self, record):
+        with self.condition:
+            is_full = len(self.records) >= self.capacity
+            if is_full:
+                self.records.popleft()
+                self.dropped += 1
+            self.records.append(record)
+            self.condition.notify()
+        return is_full
+
+    def get_batch(self, size, timeout):
+        with self.condition:
+            if not self.records and timeout > 0:
+                self.condition.wait(timeout)
+            return [self.records.popleft() for _ in range(min(size, len(self.records)))]
+
+    def wake(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def __len__(self):
+        return len(self.records)
+
+class BatchingListener:
+    def __init__(self, queue, sink, batch_size, flush_interval, dropped):
+        self.queue          = queue
+        self.sink           = sink
+        self.dropped        = dropped
+        self.batch_size     = batch_size
+        self.flush_interval = flush_interval
+        self.stopping       = threading.Event()
+        self.thread         = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="log-shipper", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopping.is_set():
+            batch    = []
+            deadline = time.monotonic() + self.flush_interval
+
+            while len(batch) < self.batch_size and not self.stopping.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                batch += self.queue.get_batch(self.batch_size - len(batch), remaining)
+
+            self.ship(batch)
+
+        while len(self.queue):
+            self.ship(self.queue.get_batch(self.batch_size, 0))
+
+    def ship(self, batch):
+        if not batch:
+            return
+
+        try:
+            sink = self.sink()
+            for record in batch:
+                if record.levelno >= sink.level:
+                    sink.handle(record)
+            sink.flush()
+        except Exception:
+            self.dropped(len(batch))
+
+    def stop(self):
+        self.stopping.set()
+        self.queue.wake()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+class QueuedHandler(QueueHandler):
+    def __init__(self, sink, sink_options=None, capacity=10000, batch_size=100, flush_interval=5):
+        super().__init__(DropOldestQueue(capacity))
+        self.sink_factory = import_string(sink) if isinstance(sink, str) else sink
+        self.sink_options = sink_options or {}
+        self.sink_handler = None
+        self.sink_lock    = threading.Lock()
+        self.listener     = BatchingListener(self.queue, self.get_sink, batch_size, flush_interval, self.count_dropped)
+        self.start_lock   = threading.Lock()
+        atexit.register(self.close)
+
+    def get_sink(self):
+        with self.sink_lock:
+            if self.sink_handler is None:
+                self.sink_handler = self.sink_factory(**self.sink_options)
+            return self.sink_handler
+
+    def enqueue(self, record):
+        if self.listener.thread is None:
+            with self.start_lock:
+                if self.listener.thread is None and not self.listener.stopping.is_set():
+                    self.listener.start()
+
+        if self.queue.put_nowait(record):
+            self.count_dropped(1)
+
+    def count_dropped(self, count):
+        LOG_RECORDS_DROPPED.labels(self.name or "").inc(count)
+
+    def close(self):
+        self.listener.stop()
+        with self.sink_lock:
+            if self.sink_handler is not None:
+                self.sink_handler.close()
+                self.sink_handler = None
+        super().close()
+
+def cloudwatch_handler(**options):
+    session = Session(
+        aws_access_key_id     = AWS_IAM_ACCESS_KEY_ID,
+        aws_secret_access_key = AWS_IAM_SECRET_ACCESS_KEY,
+        region_name           = AWS_REGION_NAME
+    )
+    return watchtower.CloudWatchLogHandler(boto3_session=session, **options)
@@ -0,0 +1,259 @@
+import django, io, json, jwt, random, statistics, time, tracemalloc
+
+from asgiref.sync                   import async_to_sync
+from contextlib                     import ExitStack
+from django.conf                    import settings
+from django.core.cache              import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base    import BaseCommand, CommandError
+from django.db                      import connection, transaction
+from django.db.models               import Max
+from django.test                    import AsyncClient, Client, override_settings
+from django.test.utils              import CaptureQueriesContext
+from unittest.mock                  import patch, MagicMock
+
+from galleries.models import Gallery, Posting, Comment, Bookmark, Like
+from users.models     import User
+from my_settings      import SECRET_KEY, ALGORITHMS
+
+class ASGIClient(AsyncClient):
+    async def request(self, **request):
+        # ASGIHandler hands views a file of the buffered body; the test client's FakePayload rejects multipart over-reads
+        if "_body_file" in request:
+            request["_body_file"] = io.BytesIO(request["_body_file"].read())
+        return await super().request(**request)
+
+class BlockingClient:
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, method):
+        send = getattr(self.client, method)
+
+        async def call(*args, **kwargs):
+            return await send(*args, **kwargs)
+
+        return async_to_sync(call)
+
+class Command(BaseCommand):
+    help = "Drive every gallery and user route in-process and report latency, queries and memory per request"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=100, help="Timed requests per route, at least 2")
+        parser.add_argument("--warmup", type=int, default=5, help="Untimed requests per route before timing")
+        parser.add_argument("--profile-iterations", type=int, default=5, help="Requests per route traced for queries and memory")
+        parser.add_argument("--sample", type=int, default=100, help="Postings sampled as request targets")
+        parser.add_argument("--route", action="append", help="Only run routes whose name contains this text")
+        parser.add_argument("--cold", action="store_true", help="Clear the cache before every request")
+        parser.add_argument("--handler", choices=("asgi", "wsgi"), default="asgi", help="Request handler to drive; production serves ASGI")
+        parser.add_argument("--overhead", metavar="MIDDLEWARE", help="Also time every route without this middleware and report the difference")
+        parser.add_argument("--request-log-rate", type=float, help="Sample this fraction of requests in RequestLoggingMiddleware on every route")
+        parser.add_argument("--format", choices=("text", "json"), default="text")
+        parser.add_argument("--output", help="Write the report to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 2:
+            raise CommandError("--iterations must be at least 2")
+        if options["profile_iterations"] < 1:
+            raise CommandError("--profile-iterations must be at least 1")
+
+        self.random  = random.Random(0)
+        self.options = options
+        self.targets = self.sample_targets(options["sample"])
+        self.client  = self.new_client()
+        self.header  = {self.header_name("Authorization") : jwt.encode({"id" : self.targets["user_id"]}, SECRET_KEY, algorithm=ALGORITHMS)}
+
+        routes = [route for route in self.routes() if not options["route"] or any(text in route[0] for text in options["route"])]
+        report = {
+            "django"     : django.get_version(),
+            "database"   : connection.vendor,
+            "handler"    : options["handler"],
+            "dataset"    : {model._meta.db_table : model.objects.count() for model in (User, Gallery, Posting, Comment, Like, Bookmark)},
+            "iterations" : options["iterations"],
+            "cold_cache" : options["cold"],
+            "routes"     : {},
+        }
+
+        if options["overhead"] and options["overhead"] not in settings.MIDDLEWARE:
+            raise CommandError(f"{options['overhead']} is not in MIDDLEWARE")
+
+        with ExitStack() as stack:
+            self.stub_external_services(stack)
+            if options["request_log_rate"] is not None:
+                stack.enter_context(override_settings(REQUEST_LOG_SAMPLE_RATES={"default" : options["request_log_rate"]}))
+                report["request_log_rate"] = options["request_log_rate"]
+
+            clients = {"full" : self.client}
+            if options["overhead"]:
+                clients["baseline"] = self.client_without(options["overhead"])
+                report["overhead"]  = options["overhead"]
+
+            for name, send in routes:
+                self.client            = clients["full"]
+                report["routes"][name] = self.measure(send)
+
+                if options["overhead"]:
+                    self.client = clients["baseline"]
+                    baseline    = self.measure(send)
+                    report["routes"][name].update(
+                        baseline_p50_ms = baseline["p50_ms"],
+                        overhead_p50_ms = round(report["routes"][name]["p50_ms"] - baseline["p50_ms"], 3),
+                        overhead_kib    = round(report["routes"][name]["peak_kib"] - baseline["peak_kib"], 1),
+                    )
+
+        output = json.dumps(report, indent=2, sort_keys=True) if options["format"] == "json" else self.table(report)
+        if options["output"]:
+            with open(options["output"], "w") as report_file:
+                report_file.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def sample_targets(self, sample):
+        last_id = Posting.objects.aggregate(last=Max("id"))["last"]
+        if last_id is None:
+            raise CommandError("No postings found; run seed_benchmark_data first")
+
+        candidates = [self.random.randint(1, last_id) for _ in range(sample * 2)] + [last_id]
+        postings   = list(Posting.objects.filter(id__in=candidates).values_list("id", "gallery_id", "user_id")[:sample])
+        owner      = postings[0][2]
+
+        return {
+            "postings"   : postings,
+            "user_id"    : owner,
+            "other_id"   : postings[-1][2],
+            "own"        : Posting.objects.filter(user_id=owner).values_list("id", "gallery_id").first(),
+            "comment"    : Comment.objects.filter(user_id=owner).values_list("id", "posting_id", "posting__gallery_id").first(),
+            "provider"   : User.objects.filter(id=owner).values_list("kakao", "naver").first(),
+            "gallery_id" : postings[0][1],
+        }
+
+    def new_client(self):
+        return BlockingClient(ASGIClient()) if self.options["handler"] == "asgi" else Client()
+
+    def header_name(self, header):
+        return header if self.options["handler"] == "asgi" else "HTTP_" + header
+
+    def client_without(self, middleware):
+        with override_settings(MIDDLEWARE=[name for name in settings.MIDDLEWARE if name != middleware]):
+            client = self.new_client()
+            client.get("/ping")
+        return client
+
+    def stub_external_services(self, stack):
+        kakao, naver = self.targets["provider"]
+
+        async def fetch_profile(provider, access_token):
+            return {"id" : kakao or "benchmark"} if provider == "kakao" else {"response" : {"id" : naver or "benchmark"}}
+
+        stack.enter_context(patch("users.views.fetch_profile", new=fetch_profile))
+        stack.enter_context(patch("core.uploadhandlers.get_s3_client", return_value=MagicMock()))
+        stack.enter_context(patch("galleries.views.queue_derivatives"))
+
+    def posting(self):
+        return self.random.choice(self.targets["postings"])
+
+    def routes(self):
+        header, targets = self.header, self.targets
+        posting         = self.posting
+
+        def get(path, auth=False):
+            return lambda: self.client.get(path(), **(header if auth else {}))
+
+        def write(method, path, data=None, content_type=None):
+            def send():
+                kwargs = {"content_type" : content_type} if content_type else {}
+                with transaction.atomic():
+                    response = getattr(self.client, method)(path(), data, **kwargs, **header)
+                    transaction.set_rollback(True)
+                return response
+            return send
+
+        def image():
+            return SimpleUploadedFile("benchmark.jpg", b"0" * 64 * 1024, "image/jpeg")
+
+        own_id, own_gallery                          = targets["own"] or posting()[:2]
+        comment_id, comment_posting, comment_gallery = targets["comment"] or (0, own_id, own_gallery)
+        like_states                                  = {posting_id : index % 2 == 0 for index, (posting_id, _, _) in enumerate(targets["postings"][:20])}
+
+        return [
+            ("GET /galleries",                                      get(lambda: "/galleries")),
+            ("GET /galleries/<gallery_id>",                         get(lambda: "/galleries/%d" % posting()[1])),
+            ("GET /galleries/<gallery_id>?cursor=",                 get(lambda: "/galleries/%d?cursor=" % posting()[1])),
+            ("GET /galleries/<gallery_id>/<posting_id>",            get(lambda: "/galleries/%d/%d" % posting()[1::-1])),
+            ("GET /galleries/<gallery_id>/<posting_id>/comments",   get(lambda: "/galleries/%d/%d/comments" % posting()[1::-1])),
+            ("GET /galleries/<gallery_id>/<posting_id>/comments?cursor=", get(lambda: "/galleries/%d/%d/comments?cursor=" % posting()[1::-1])),
+            ("GET /galleries/bookmark-list",                        get(lambda: "/galleries/bookmark-list", auth=True)),
+            ("POST /galleries/<gallery_id>/bookmark",               write("post", lambda: "/galleries/%d/bookmark" % targets["gallery_id"])),
+            ("POST /galleries/<gallery_id>",                        write("post", lambda: "/galleries/%d" % targets["gallery_id"], {"title" : "benchmark", "content" : "benchmark"})),
+            ("POST /galleries/<gallery_id>/<posting_id>",           write("post", lambda: "/galleries/%d/%d" % (own_gallery, own_id), {"title" : "benchmark", "content" : "benchmark"})),
+            ("DELETE /galleries/<gallery_id>/<posting_id>",         write("delete", lambda: "/galleries/%d/%d" % (own_gallery, own_id))),
+            ("POST /galleries/<gallery_id>/<posting_id>/like",      write("post", lambda: "/galleries/%d/%d/like" % posting()[1::-1])),
+            ("POST /galleries/<gallery_id>/<posting_id>/comments",  write("post", lambda: "/galleries/%d/%d/comments" % posting()[1::-1], json.dumps({"content" : "benchmark"}), "application/json")),
+            ("PATCH /galleries/<gallery_id>/<posting_id>/comments/<comment_id>",  write("patch", lambda: "/galleries/%d/%d/comments/%d" % (comment_gallery, comment_posting, comment_id), json.dumps({"content" : "benchmark"}), "application/json")),
+            ("DELETE /galleries/<gallery_id>/<posting_id>/comments/<comment_id>", write("delete", lambda: "/galleries/%d/%d/comments/%d" % (comment_gallery, comment_posting, comment_id))),
+            ("POST /galleries/likes",                               write("post", lambda: "/galleries/likes", json.dumps({"states" : like_states}), "application/json")),
+            ("POST /galleries/bookmarks",                           write("post", lambda: "/galleries/bookmarks", json.dumps({"states" : {targets["gallery_id"] : True}}), "application/json")),
+            ("POST /galleries/images",                              write("post", lambda: "/galleries/images", {"image" : image()})),
+            ("POST /users/namecard",                                write("post", lambda: "/users/namecard", {"userName" : "benchmark", "userImage" : image()})),
+            ("GET /users/namecard",                                 get(lambda: "/users/namecard", auth=True)),
+            ("POST /users/kakao",                                   write("post", lambda: "/users/kakao", content_type="application/json")),
+            ("POST /users/naver",                                   write("post", lambda: "/users/naver", content_type="application/json")),
+            ("POST /users/nickname",                                write("post", lambda: "/users/nickname", json.dumps({"nickname" : "benchmark"}), "application/json")),
+            ("GET /users/myprofile",                                get(lambda: "/users/myprofile", auth=True)),
+            ("GET /users/myprofile?section=likes",                  get(lambda: "/users/myprofile?section=likes", auth=True)),
+            ("GET /users/<user_id>/profile",                        get(lambda: "/users/%d/profile" % targets["other_id"], auth=True)),
+        ]
+
+    def send(self, send):
+        if self.options["cold"]:
+            cache.clear()
+
+        start    = time.perf_counter()
+        response = send()
+        return response, (time.perf_counter() - start) * 1000
+
+    def measure(self, send):
+        for _ in range(self.options["warmup"]):
+            self.send(send)
+
+        timings  = []
+        statuses = set()
+        for _ in range(self.options["iterations"]):
+            response, elapsed = self.send(send)
+            timings.append(elapsed)
+            statuses.add(response.status_code)
+
+        queries, peaks = [], []
+        for _ in range(self.options["profile_iterations"]):
+            with CaptureQueriesContext(connection) as captured:
+                tracemalloc.start()
+                self.send(send)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            queries.append(len(captured))
+
+        cuts = statistics.quantiles(timings, n=100)
+        return {
+            "status"   : sorted(statuses),
+            "mean_ms"  : round(statistics.mean(timings), 3),
+            "p50_ms"   : round(statistics.median(timings), 3),
+            "p95_ms"   : round(cuts[94], 3),
+            "p99_ms"   : round(cuts[98], 3),
+            "queries"  : round(statistics.mean(queries), 2),
+            "peak_kib" : round(max(peaks) / 1024, 1),
+        }
+
+    def table(self, report):
+        lines = [f"{report['handler']} {report['database']} {report['dataset']}"]
+        lines.append(f"{'route':<68} {'status':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'peak KiB':>9}")
+        if "overhead" in report:
+            lines[-1] += f" {'+ms p50':>9} {'+KiB':>7}"
+
+        for name, result in report["routes"].items():
+            lines.append(
+                f"{name:<68} {','.join(map(str, result['status'])):>9} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f}"
+                f" {result['p99_ms']:9.2f} {result['queries']:8.2f} {result['peak_kib']:9.1f}"
+            )
+            if "overhead" in report:
+                lines[-1] += f" {result['overhead_p50_ms']:9.3f} {result['overhead_kib']:7.1f}"
+        return "\n".join(lines)
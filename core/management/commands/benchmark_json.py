@@ -0,0 +1,85 @@
+import statistics, time
+
+from datetime                    import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+
+from core.http import JSON_BACKENDS, orjson
+
+class Command(BaseCommand):
+    help = "Compare encode time and response size of the JSON response backends on the API's payload shapes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10, help="Rows per list payload")
+        parser.add_argument("--iterations", type=int, default=1000, help="Encodes per payload and backend, at least 2")
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 2:
+            raise CommandError("--iterations must be at least 2")
+
+        backends = dict(JSON_BACKENDS)
+        if orjson is None:
+            del backends["orjson"]
+            self.stdout.write("orjson is not installed, benchmarking the stdlib backend only")
+
+        for shape, payload in self.payloads(options["rows"]).items():
+            for name, dumps in backends.items():
+                timings = []
+                for _ in range(options["iterations"]):
+                    start = time.perf_counter()
+                    content = dumps(payload)
+                    timings.append((time.perf_counter() - start) * 1000000)
+
+                self.stdout.write(
+                    f"{shape:<10} {name:<7} mean {statistics.mean(timings):9.2f} us"
+                    f"  p95 {statistics.quantiles(timings, n=20)[18]:9.2f} us"
+                    f"  {len(content):8d} bytes"
+                )
+
+    def payloads(self, rows):
+        now = datetime.now()
+
+        postings = [{
+            "id"            : i,
+            "title"         : f"posting title {i}",
+            "thumbnail"     : f"https://bucket.s3.amazonaws.com/derivatives/thumbnail/{i:032x}.webp",
+            "view_count"    : i * 7,
+            "created_at"    : now - timedelta(minutes=i),
+            "updated_at"    : now - timedelta(seconds=i),
+            "comment_count" : i % 5,
+            "user_nickname" : f"user{i}",
+            "user_id"       : i,
+        } for i in range(rows)]
+
+        comments = [{
+            "id"            : i,
+            "content"       : "comment content " * 4,
+            "created_at"    : now - timedelta(minutes=i),
+            "updated_at"    : now - timedelta(seconds=i),
+            "user_nickname" : f"user{i}",
+            "user_id"       : i,
+        } for i in range(rows)]
+
+        profile_postings = [{
+            "gallery_id" : i % 8,
+            "id"         : i,
+            "title"      : f"posting title {i}",
+            "content"    : "posting content " * 16,
+            "created_at" : now - timedelta(minutes=i),
+        } for i in range(rows)]
+
+        return {
+            "galleries" : {"MESSAGE" : [{"gallery_id" : i, "gallery_name" : f"gallery {i}", "gallery_image" : f"{i}.jpg"} for i in range(rows)]},
+            "postings"  : {"MESSAGE" : postings, "IS_NEXT" : True, "NEXT_CURSOR" : "WyIyMDIxLTA5LTAxVDEyOjAwOjAwIiwgMTBd"},
+            "posting"   : {"MESSAGE" : dict(postings[0], content="posting content " * 64, prev_id=None, next_id=1, first=True, last=False)},
+            "comments"  : {"MESSAGE" : comments, "PAGE_RANGE" : 3},
+            "profile"   : {"MESSAGE" : {
+                "namecard"           : {"image" : "me.jpg", "name" : "name", "slogan" : "slogan", "introduce" : "introduce",
+                                        "email" : "me@example.com", "location" : "Seoul", "works" : []},
+                "bookmarks"          : [{"gallery_id" : i, "gallery_name" : f"gallery {i}", "gallery_image" : f"{i}.jpg"} for i in range(rows)],
+                "postings"           : profile_postings,
+                "likes"              : profile_postings,
+                "commented_postings" : profile_postings,
+                "next_cursors"       : {"bookmarks" : None, "postings" : None, "likes" : None, "commented_postings" : None},
+                "is_editable"        : True,
+            }},
+        }
@@ -0,0 +1,67 @@
+import boto3, io, statistics, time, uuid
+
+from django.conf                    import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base    import BaseCommand, CommandError
+
+from core.utils  import CloudStorage, s3_clients
+from my_settings import AWS_IAM_ACCESS_KEY_ID, AWS_IAM_SECRET_ACCESS_KEY, AWS_S3_STORAGE_BUCKET_NAME
+
+class Command(BaseCommand):
+    help = "Compare per-upload latency of a fresh S3 client per upload against the shared pooled client"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--uploads", type=int, default=50, help="Uploads per client mode, at least 2")
+        parser.add_argument("--size", type=int, default=256 * 1024, help="Bytes per upload")
+        parser.add_argument("--moto", action="store_true", help="Upload to moto's in-process S3 instead of the configured endpoint")
+
+    def handle(self, *args, **options):
+        if options["uploads"] < 2:
+            raise CommandError("--uploads must be at least 2")
+
+        if not options["moto"]:
+            return self.benchmark(options["uploads"], options["size"])
+
+        try:
+            from moto import mock_aws
+        except ImportError:
+            try:
+                from moto import mock_s3 as mock_aws
+            except ImportError:
+                raise CommandError("moto is not installed")
+
+        with mock_aws():
+            boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=AWS_S3_STORAGE_BUCKET_NAME)
+            self.benchmark(options["uploads"], options["size"])
+
+    def benchmark(self, uploads, size):
+        payload = b"0" * size
+
+        def fresh_client():
+            s3_client = boto3.client(
+                "s3",
+                aws_access_key_id     = AWS_IAM_ACCESS_KEY_ID,
+                aws_secret_access_key = AWS_IAM_SECRET_ACCESS_KEY,
+                endpoint_url          = settings.AWS_S3_ENDPOINT_URL
+            )
+            s3_client.upload_fileobj(io.BytesIO(payload), AWS_S3_STORAGE_BUCKET_NAME, uuid.uuid4().hex)
+
+        def pooled_client():
+            cloud_storage = CloudStorage(id = AWS_IAM_ACCESS_KEY_ID, password = AWS_IAM_SECRET_ACCESS_KEY,
+                                         bucket = AWS_S3_STORAGE_BUCKET_NAME)
+            cloud_storage.upload_file(SimpleUploadedFile("benchmark.bin", payload, "application/octet-stream"))
+
+        s3_clients.clear()
+        for name, upload in (("fresh client", fresh_client), ("pooled client", pooled_client)):
+            timings = []
+            for _ in range(uploads):
+                start = time.perf_counter()
+                upload()
+                timings.append((time.perf_counter() - start) * 1000)
+
+            self.stdout.write(
+                f"{name:<14} mean {statistics.mean(timings):8.2f} ms"
+                f"  p50 {statistics.median(timings):8.2f} ms"
+                f"  p95 {statistics.quantiles(timings, n=20)[18]:8.2f} ms"
+            )
+        s3_clients.clear()
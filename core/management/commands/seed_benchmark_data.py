@@ -0,0 +1,117 @@
+import random
+
+from itertools                   import islice
+from django.core.management.base import BaseCommand, CommandError
+from django.db                   import transaction
+
+from galleries.models import Gallery, Posting, Comment, Bookmark, Viewcount, Like
+from users.models     import User, History
+
+WORDS = ("gallery", "posting", "seso", "photo", "travel", "coffee", "night", "city", "spring", "river", "art", "note")
+
+class Command(BaseCommand):
+    help = "Fill an empty database with a large synthetic dataset for benchmark_endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100000)
+        parser.add_argument("--galleries", type=int, default=100)
+        parser.add_argument("--postings", type=int, default=1000000)
+        parser.add_argument("--comments", type=int, default=10000000)
+        parser.add_argument("--likes", type=int, default=10000000)
+        parser.add_argument("--bookmarks", type=int, default=5, help="Bookmarked galleries per user")
+        parser.add_argument("--histories", type=int, default=2, help="Namecard history rows per user")
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        users, galleries, postings = options["users"], options["galleries"], options["postings"]
+
+        if min(users, galleries, postings) < 1:
+            raise CommandError("--users, --galleries and --postings must be at least 1")
+        if options["bookmarks"] > galleries:
+            raise CommandError("--bookmarks cannot exceed --galleries")
+        if -(-options["likes"] // postings) > users:
+            raise CommandError("--likes allows at most --users likes per posting")
+        if User.objects.exists() or Gallery.objects.exists():
+            raise CommandError("The database already has data; seed an empty benchmark database")
+
+        self.batch_size = options["batch_size"]
+        self.random     = random.Random(options["seed"])
+
+        user_ids = self.create(User, users, (User(
+            nickname = f"user{i}",
+            kakao    = f"kakao{i}",
+            naver    = f"naver{i}",
+            name     = f"name{i}",
+            slogan   = self.text(4),
+            email    = f"user{i}@example.com",
+        ) for i in range(users)))
+
+        self.create(History, users * options["histories"], (History(
+            user_id  = user_id,
+            year     = 2000 + i,
+            title    = self.text(3),
+            subtitle = self.text(6),
+        ) for user_id in user_ids for i in range(options["histories"])), ids=False)
+
+        gallery_ids = self.create(Gallery, galleries, (Gallery(
+            name  = f"gallery{i}",
+            image = f"https://example.com/galleries/{i}.jpg",
+        ) for i in range(galleries)))
+
+        def share(index, total):
+            return total // postings + (1 if index < total % postings else 0)
+
+        view_counts = [self.random.randrange(1000) for _ in range(postings)]
+        posting_ids = self.create(Posting, postings, (Posting(
+            gallery_id    = gallery_ids[i % galleries],
+            user_id       = self.random.choice(user_ids),
+            title         = self.text(5),
+            content       = self.text(60),
+            thumbnail     = f"https://example.com/thumbnails/{i}.webp",
+            comment_count = share(i, options["comments"]),
+            like_count    = share(i, options["likes"]),
+            view_count    = view_counts[i],
+        ) for i in range(postings)))
+
+        self.create(Viewcount, postings, (Viewcount(
+            posting_id = posting_id,
+            view_count = view_count,
+        ) for posting_id, view_count in zip(posting_ids, view_counts)), ids=False)
+
+        self.create(Comment, options["comments"], (Comment(
+            posting_id = posting_ids[i % postings],
+            user_id    = self.random.choice(user_ids),
+            content    = self.text(12),
+        ) for i in range(options["comments"])), ids=False)
+
+        self.create(Like, options["likes"], (Like(
+            posting_id = posting_ids[i % postings],
+            user_id    = user_ids[((i % postings) * 7919 + i // postings) % users],
+        ) for i in range(options["likes"])), ids=False)
+
+        self.create(Bookmark, users * options["bookmarks"], (Bookmark(
+            user_id    = user_id,
+            gallery_id = gallery_ids[(index * 31 + k) % galleries],
+        ) for index, user_id in enumerate(user_ids) for k in range(options["bookmarks"])), ids=False)
+
+        self.stdout.write(self.style.SUCCESS("Benchmark dataset ready"))
+
+    def text(self, words):
+        return " ".join(self.random.choice(WORDS) for _ in range(words))
+
+    def create(self, model, total, objects, ids=True):
+        created = 0
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                break
+
+            with transaction.atomic():
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+            created += len(batch)
+            self.stdout.write(f"\r{model._meta.db_table:<10} {created:>10}/{total}", ending="")
+
+        self.stdout.write("")
+        if ids:
+            return list(model.objects.order_by("id").values_list("id", flat=True))
@@ -0,0 +1,70 @@
+import os
+import time
+
+from contextlib        import contextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+REQUESTS = Counter(
+    "seso_http_requests_total", "Requests handled, by route and status",
+    ["method", "route", "status"]
+)
+REQUEST_DURATION = Histogram(
+    "seso_http_request_duration_seconds", "Time spent handling a request",
+    ["method", "route"]
+)
+DB_QUERIES = Counter(
+    "seso_db_queries_total", "SQL queries executed while handling requests",
+    ["route"]
+)
+DB_DURATION = Histogram(
+    "seso_db_request_duration_seconds", "SQL time spent per request",
+    ["route"]
+)
+S3_UPLOAD_DURATION = Histogram(
+    "seso_s3_upload_duration_seconds", "Time spent in S3 upload calls",
+    ["operation"]
+)
+OAUTH_DURATION = Histogram(
+    "seso_oauth_request_duration_seconds", "Time spent calling OAuth profile endpoints",
+    ["provider", "outcome"]
+)
+LOG_RECORDS_DROPPED = Counter(
+    "seso_log_records_dropped_total", "Log records dropped because a log queue was full",
+    ["handler"]
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "seso_db_pool_connections", "Open connections held by a database connection pool",
+    ["alias"], multiprocess_mode="livesum"
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "seso_db_pool_checked_out", "Pooled database connections currently in use",
+    ["alias"], multiprocess_mode="livesum"
+)
+DB_POOL_WAITS = Counter(
+    "seso_db_pool_waits_total", "Checkouts that had to wait for a free pooled connection",
+    ["alias"]
+)
+DB_POOL_WAIT_DURATION = Histogram(
+    "seso_db_pool_wait_seconds", "Time spent waiting for a free pooled connection",
+    ["alias"]
+)
+
+@contextmanager
+def timed(histogram, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+
+def route_label(request):
+    match = getattr(request, "resolver_match", None)
+    return "/" + match.route if match else "unmatched"
+
+def render():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,23 @@
+import re
+
+from django.db import connections
+
+SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(?!SUBQUERY \d|CONSTANT ROW)(\w+)")
+
+def explain(sql, params=(), using="default"):
+    connection = connections[using]
+    prefix     = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def full_table_scans(sql, params=(), using="default"):
+    plan = explain(sql, params, using)
+
+    if connections[using].vendor == "sqlite":
+        scans = [SQLITE_SCAN.match(row["detail"]) for row in plan]
+        return [scan.group(1) for scan in scans if scan]
+
+    return [row["table"] for row in plan if row["type"] in ("ALL", "index") and row["table"] and not row["table"].startswith("<")]
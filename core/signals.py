@@ -0,0 +1,16 @@
+from contextvars                import ContextVar
+from django.db.backends.signals import connection_created
+from django.dispatch            import receiver
+
+active_recorder = ContextVar("active_recorder", default=None)
+
+def record_query(execute, sql, params, many, context):
+    recorder = active_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
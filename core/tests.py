@@ -1,3 +1,780 @@
-from django.test import TestCase
+import asyncio, boto3, io, json, jwt, logging, os, runpy, tempfile, threading, time
 
-# Create your tests here.
+from asgiref.testing                import ApplicationCommunicator
+from datetime                       import datetime
+from decimal                        import Decimal
+from django.conf                    import settings
+from django.core.cache              import cache
+from django.core.exceptions         import ImproperlyConfigured
+from django.core.management         import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db                      import connections, transaction
+from django.db.models               import Sum
+from django.test                    import TestCase, TransactionTestCase, Client, AsyncClient, override_settings
+from django.test.utils              import CaptureQueriesContext
+from unittest                       import skipUnless
+from unittest.mock                  import patch, MagicMock
+from PIL                            import Image
+from prometheus_client              import REGISTRY
+
+from core.db.backends.mysql import base as pooled_mysql
+from core.db.pool           import ConnectionPool, PoolTimeout
+from core.db.routers        import read_database
+from core.http              import JsonResponse
+from core.log               import QueuedHandler
+from core.queryplan         import full_table_scans
+from core.images            import build_derivatives, create_derivatives, derivative_url, queue_derivatives, ready_key
+from core.utils             import CloudStorage, s3_clients
+from galleries.models       import Gallery, Posting, Comment, Like
+from galleries.utils        import gallery_bounds, gallery_catalogue, wait_for_thumbnail
+from users.models           import User
+from seso.asgi              import application
+from my_settings            import AWS_S3_BUCKET_URL, SECRET_KEY, ALGORITHMS
+
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+class CloudStorageTest(TestCase):
+    def setUp(self):
+        s3_clients.clear()
+
+    def tearDown(self):
+        s3_clients.clear()
+
+    @override_settings(AWS_S3_MAX_POOL_CONNECTIONS = 25)
+    @patch("core.utils.boto3.client")
+    def test_s3_client_is_shared(self, mocked_client):
+        first  = CloudStorage(id = "id", password = "password", bucket = "bucket")
+        second = CloudStorage(id = "id", password = "password", bucket = "bucket")
+
+        self.assertIs(first.s3_client, second.s3_client)
+        self.assertEqual(mocked_client.call_count, 1)
+        self.assertEqual(mocked_client.call_args.kwargs["config"].max_pool_connections, 25)
+
+    @skipUnless(mock_aws, "moto is not installed")
+    def test_upload_file_to_local_s3(self):
+        with mock_aws():
+            boto3.client("s3", region_name = "us-east-1").create_bucket(Bucket = "bucket")
+
+            cloud_storage = CloudStorage(id = "id", password = "password", bucket = "bucket")
+            image         = SimpleUploadedFile(name = "test.jpeg", content = b"file_content", content_type = "image/jpeg")
+            upload_key    = cloud_storage.upload_file(image)
+
+            stored = cloud_storage.s3_client.get_object(Bucket = "bucket", Key = upload_key)
+            self.assertEqual(stored["Body"].read(), b"file_content")
+            self.assertEqual(stored["ContentType"], "image/jpeg")
+
+class ImageDerivativeTest(TestCase):
+    def original(self):
+        exif      = Image.Exif()
+        exif[274] = 6
+        exif[271] = "camera"
+        buffer    = io.BytesIO()
+        Image.new("RGB", (1200, 800), "red").save(buffer, "JPEG", exif = exif)
+        return buffer.getvalue()
+
+    @patch("core.images.get_s3_client")
+    def test_create_derivatives(self, mocked_client):
+        s3 = mocked_client.return_value
+        s3.get_object.return_value = {"Body" : io.BytesIO(self.original())}
+
+        create_derivatives("abc.jpeg")
+
+        uploads = {call.kwargs["Key"] : call.kwargs for call in s3.put_object.call_args_list}
+        self.assertEqual(set(uploads), {"derivatives/thumbnail/abc.webp", "derivatives/webp/abc.webp"})
+
+        thumbnail = Image.open(io.BytesIO(uploads["derivatives/thumbnail/abc.webp"]["Body"]))
+        self.assertEqual(thumbnail.format, "WEBP")
+        self.assertEqual(thumbnail.size, (267, 400))
+        self.assertFalse(thumbnail.getexif())
+
+        webp = Image.open(io.BytesIO(uploads["derivatives/webp/abc.webp"]["Body"]))
+        self.assertEqual(webp.size, (800, 1200))
+        self.assertEqual(uploads["derivatives/webp/abc.webp"]["ContentType"], "image/webp")
+
+    def test_derivative_url(self):
+        self.assertEqual(derivative_url(AWS_S3_BUCKET_URL + "abc.jpeg"), AWS_S3_BUCKET_URL + "derivatives/thumbnail/abc.webp")
+        self.assertEqual(derivative_url("https://elsewhere.example/abc.jpeg"), "https://elsewhere.example/abc.jpeg")
+
+    def posting(self, thumbnail):
+        user    = User.objects.create(kakao = "1")
+        gallery = Gallery.objects.create(name = "test", image = "image.jpg")
+        return Posting.objects.create(gallery = gallery, user = user, title = "title", content = "content", thumbnail = thumbnail)
+
+    @patch("core.images.get_s3_client")
+    def test_thumbnail_switched_after_upload(self, mocked_client):
+        mocked_client.return_value.get_object.return_value = {"Body" : io.BytesIO(self.original())}
+        posting = self.posting(AWS_S3_BUCKET_URL + "abc.jpeg")
+        other   = Posting.objects.create(gallery = posting.gallery, user = posting.user, title = "t", content = "c", thumbnail = posting.thumbnail)
+        cache.delete(ready_key("abc.jpeg"))
+        wait_for_thumbnail(posting)
+
+        with CaptureQueriesContext(connections["default"]) as queries:
+            build_derivatives("abc.jpeg")
+
+        updates = [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"postings"."id" IN', updates[0])
+
+        posting.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(posting.thumbnail, AWS_S3_BUCKET_URL + "derivatives/thumbnail/abc.webp")
+        self.assertEqual(other.thumbnail, AWS_S3_BUCKET_URL + "abc.jpeg")
+        self.assertTrue(cache.get(ready_key("abc.jpeg")))
+
+    def test_thumbnail_attached_when_ready_before_waiting(self):
+        posting = self.posting(AWS_S3_BUCKET_URL + "abc.jpeg")
+        cache.set(ready_key("abc.jpeg"), True)
+
+        wait_for_thumbnail(posting)
+
+        posting.refresh_from_db()
+        self.assertEqual(posting.thumbnail, AWS_S3_BUCKET_URL + "derivatives/thumbnail/abc.webp")
+
+    @patch("core.images.get_s3_client")
+    def test_unreadable_image_keeps_original(self, mocked_client):
+        mocked_client.return_value.get_object.return_value = {"Body" : io.BytesIO(b"<svg xmlns='http://www.w3.org/2000/svg'/>")}
+        posting = self.posting(AWS_S3_BUCKET_URL + "abc.svg")
+
+        with self.assertRaises(Exception):
+            build_derivatives("abc.svg")
+
+        posting.refresh_from_db()
+        self.assertEqual(posting.thumbnail, AWS_S3_BUCKET_URL + "abc.svg")
+        self.assertFalse(mocked_client.return_value.put_object.called)
+
+    @patch("core.images.logger")
+    @patch("core.images.executor")
+    def test_full_queue_skips_derivatives(self, mocked_executor, mocked_logger):
+        with patch("core.images.pending", threading.BoundedSemaphore(1)):
+            self.assertTrue(queue_derivatives("first.jpeg"))
+            self.assertFalse(queue_derivatives("second.jpeg"))
+
+        mocked_executor.submit.assert_called_once()
+        mocked_logger.warning.assert_called_once()
+
+class JsonResponseTest(TestCase):
+    data = {"MESSAGE" : [{
+        "id"         : 1,
+        "created_at" : datetime(2021, 9, 1, 12, 30, 15, 123456),
+        "day"        : datetime(2021, 9, 1).date(),
+        "price"      : Decimal("1.50"),
+        "title"      : "제목",
+    }]}
+
+    def test_backends_agree(self):
+        decoded = [json.loads(JsonResponse(self.data, backend=backend).content) for backend in ("json", "orjson")]
+
+        self.assertEqual(decoded[0], decoded[1])
+        self.assertEqual(decoded[0]["MESSAGE"][0]["created_at"], "2021-09-01T12:30:15.123")
+        self.assertEqual(decoded[0]["MESSAGE"][0]["day"], "2021-09-01")
+        self.assertEqual(decoded[0]["MESSAGE"][0]["price"], "1.50")
+
+    @override_settings(JSON_RESPONSE_BACKEND = "orjson")
+    def test_falls_back_without_orjson(self):
+        with patch("core.http.orjson", None):
+            response = JsonResponse(self.data, status=201)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(json.loads(response.content)["MESSAGE"][0]["title"], "제목")
+
+    @override_settings(JSON_RESPONSE_BACKEND = "yaml")
+    def test_unknown_backend(self):
+        with self.assertRaises(ImproperlyConfigured):
+            JsonResponse(self.data)
+
+    def test_non_dict_needs_safe_false(self):
+        with self.assertRaises(TypeError):
+            JsonResponse([1, 2])
+        self.assertEqual(json.loads(JsonResponse([1, 2], safe=False).content), [1, 2])
+
+class EndpointBenchmarkTest(TestCase):
+    def test_seed_and_benchmark_every_route(self):
+        call_command("seed_benchmark_data", users=5, galleries=2, postings=10, comments=30, likes=20, bookmarks=2, stdout=io.StringIO())
+
+        self.assertEqual(Posting.objects.count(), 10)
+        self.assertEqual(Posting.objects.aggregate(total=Sum("like_count"))["total"], Like.objects.count())
+        self.assertEqual(Posting.objects.aggregate(total=Sum("comment_count"))["total"], Comment.objects.count())
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "report.json")
+            call_command("benchmark_endpoints", iterations=2, warmup=0, profile_iterations=1, format="json", output=output)
+            with open(output) as report_file:
+                report = json.load(report_file)
+
+        self.assertEqual(report["handler"], "asgi")
+        self.assertEqual(report["dataset"]["postings"], 10)
+        self.assertEqual(len(report["routes"]), 26)
+        for name, result in report["routes"].items():
+            self.assertTrue(all(status < 500 for status in result["status"]), name)
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+
+        self.assertEqual(Posting.objects.count(), 10)
+
+    def test_middleware_overhead(self):
+        call_command("seed_benchmark_data", users=5, galleries=2, postings=10, comments=30, likes=20, bookmarks=2, stdout=io.StringIO())
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "report.json")
+            call_command(
+                "benchmark_endpoints", iterations=2, warmup=0, profile_iterations=1, route=["GET /galleries"], format="json", output=output,
+                overhead="seso.middleware.RequestLoggingMiddleware", request_log_rate=1, handler="wsgi"
+            )
+            with open(output) as report_file:
+                report = json.load(report_file)
+
+        self.assertEqual(report["handler"], "wsgi")
+        self.assertEqual(report["overhead"], "seso.middleware.RequestLoggingMiddleware")
+        for result in report["routes"].values():
+            self.assertIn("overhead_p50_ms", result)
+            self.assertIn("baseline_p50_ms", result)
+
+class QueryInstrumentationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        Gallery.objects.create(name = "test", image = "image.jpg")
+
+    @override_settings(INTERNAL_IPS = ["127.0.0.1"])
+    def test_server_timing_counts_queries(self):
+        with self.assertLogs("seso.sql", level="INFO") as logs:
+            response = Client().get("/galleries")
+
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="1 queries", app;dur=[\d.]+$')
+        self.assertEqual(logs.records[0].db_queries, 1)
+        self.assertEqual(logs.records[0].status, 200)
+
+    def test_server_timing_hidden_from_other_clients(self):
+        with self.assertLogs("seso.sql", level="INFO") as logs:
+            response = Client().get("/galleries")
+
+        self.assertFalse(response.has_header("Server-Timing"))
+        self.assertEqual(logs.records[0].db_queries, 1)
+
+    @override_settings(SERVER_TIMING_ENABLED = True)
+    async def test_server_timing_counts_queries_under_asgi(self):
+        response = await AsyncClient().get("/galleries")
+
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="1 queries", app;dur=[\d.]+$')
+
+    @override_settings(SQL_SLOW_QUERY_MS = 0)
+    def test_slow_queries_logged_with_sql(self):
+        with self.assertLogs("seso.sql", level="WARNING") as logs:
+            Client().get("/galleries")
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('FROM "galleries"', logs.records[0].sql)
+        self.assertEqual(logs.records[0].path, "/galleries")
+
+class QueryPlanTest(TestCase):
+    def test_sqlite_scan_wordings(self):
+        plan = [
+            {"detail" : "SCAN galleries"},
+            {"detail" : "SCAN TABLE postings USING INDEX postings_gallery_id"},
+            {"detail" : "SEARCH users USING INTEGER PRIMARY KEY (rowid=?)"},
+            {"detail" : "SCAN (subquery-1)"},
+            {"detail" : "SCAN SUBQUERY 1"},
+            {"detail" : "SCAN CONSTANT ROW"},
+            {"detail" : "USE TEMP B-TREE FOR ORDER BY"},
+        ]
+        with patch("core.queryplan.explain", return_value=plan):
+            self.assertEqual(full_table_scans("SELECT 1"), ["galleries", "postings"])
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        Gallery.objects.create(name = "test", image = "image.jpg")
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_counted_per_route(self):
+        labels  = {"method" : "GET", "route" : "/galleries/<int:gallery_id>", "status" : "200"}
+        before  = self.sample("seso_http_requests_total", **labels)
+        queries = self.sample("seso_db_queries_total", route = labels["route"])
+
+        Client().get(f"/galleries/{Gallery.objects.get().id}")
+
+        self.assertEqual(self.sample("seso_http_requests_total", **labels), before + 1)
+        self.assertEqual(self.sample("seso_db_queries_total", route = labels["route"]), queries + 2)
+
+    @override_settings(INTERNAL_IPS = ["127.0.0.1"])
+    def test_metrics_endpoint(self):
+        Client().get("/galleries")
+        response = Client().get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(b'seso_http_request_duration_seconds_bucket{le="0.005",method="GET",route="/galleries"}', response.content)
+        self.assertIn(b"seso_s3_upload_duration_seconds", response.content)
+
+    @override_settings(INTERNAL_IPS = ["10.0.0.1"])
+    def test_metrics_hidden_from_external_clients(self):
+        response = Client().get("/metrics")
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(b"seso_http_requests_total", response.content)
+
+        response = Client(REMOTE_ADDR = "10.0.0.1").get("/metrics")
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(INTERNAL_IPS = ["10.0.0.1"])
+    async def test_async_metrics_hidden_from_external_clients(self):
+        response = await AsyncClient().get("/metrics")
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_ENABLED = True)
+    def test_metrics_enabled_for_everyone(self):
+        self.assertEqual(Client().get("/metrics").status_code, 200)
+
+@override_settings(REQUEST_LOG_SAMPLE_RATES = {"default" : 1}, REQUEST_LOG_MAX_BODY = 16)
+class RequestLoggingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        Gallery.objects.create(name = "test", image = "image.jpg")
+
+    def test_headers_redacted(self):
+        with self.assertLogs("seso.request", level="INFO") as logs:
+            Client().get("/galleries", HTTP_AUTHORIZATION = "secret-token", HTTP_X_CLIENT = "web")
+
+        record = logs.records[0]
+        self.assertEqual(record.levelno, logging.INFO)
+        self.assertEqual(record.route, "/galleries")
+        self.assertEqual(record.headers["Authorization"], "[REDACTED]")
+        self.assertEqual(record.headers["X-Client"], "web")
+        self.assertNotIn("secret-token", record.getMessage())
+
+    def test_text_body_truncated(self):
+        token = jwt.encode({"id" : User.objects.create(kakao = "1").id}, SECRET_KEY, algorithm = ALGORITHMS)
+        with self.assertLogs("seso.request", level="INFO") as logs:
+            Client().post("/users/nickname", json.dumps({"nickname" : "a" * 100}), content_type = "application/json", HTTP_AUTHORIZATION = token)
+
+        self.assertEqual(logs.records[0].body, '{"nickname": "aa...')
+
+    def test_unread_body_not_read(self):
+        with self.assertLogs("seso.request", level="INFO") as logs:
+            Client().post("/users/nickname", json.dumps({"nickname" : "a" * 100}), content_type = "application/json")
+
+        self.assertEqual(logs.records[0].status, 400)
+        self.assertEqual(logs.records[0].body, "<application/json 116 bytes>")
+
+    @patch("core.uploadhandlers.get_s3_client", return_value = MagicMock())
+    def test_upload_body_elided(self, mocked_client):
+        image = SimpleUploadedFile("test.jpg", b"0" * 1024, "image/jpeg")
+        with self.assertLogs("seso.request", level="INFO") as logs:
+            Client().post("/galleries/images", {"image" : image})
+
+        self.assertRegex(logs.records[0].body, r"^<multipart/form-data \d+ bytes>$")
+
+    @override_settings(REQUEST_LOG_SAMPLE_RATES = {"default" : 0})
+    def test_unsampled_requests_not_logged(self):
+        with patch("seso.middleware.request_logger.log") as log:
+            Client().get("/galleries")
+
+        log.assert_not_called()
+
+    @override_settings(REQUEST_LOG_SAMPLE_RATES = {"default" : 0}, REQUEST_LOG_SLOW_MS = 0)
+    def test_slow_requests_always_logged(self):
+        with self.assertLogs("seso.request", level="WARNING") as logs:
+            Client().get("/galleries")
+
+        self.assertEqual(logs.records[0].status, 200)
+
+    @override_settings(REQUEST_LOG_SAMPLE_RATES = {"default" : 0})
+    def test_server_errors_always_logged(self):
+        with patch("galleries.views.gallery_catalogue.get", side_effect = RuntimeError), self.assertLogs("seso.request", level="WARNING") as logs:
+            Client(raise_request_exception = False).get("/galleries")
+
+        self.assertEqual(logs.records[0].status, 500)
+
+class QueuedLogHandlerTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "cloudwatch.log")
+
+    def handler(self, **options):
+        handler = QueuedHandler("logging.FileHandler", {"filename" : self.path}, **options)
+        handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+        self.addCleanup(handler.close)
+        return handler
+
+    def lines(self):
+        with open(self.path) as log_file:
+            return log_file.read().splitlines()
+
+    def record(self, message, level=logging.WARNING):
+        return logging.LogRecord("seso", level, __file__, 1, message, (), None)
+
+    def test_records_shipped_in_batches(self):
+        handler = self.handler(batch_size=10, flush_interval=60)
+        for i in range(25):
+            handler.handle(self.record(f"message {i}"))
+        handler.close()
+
+        self.assertEqual(self.lines(), [f"WARNING message {i}" for i in range(25)])
+
+    def test_partial_batch_flushed_by_age(self):
+        handler = self.handler(batch_size=100, flush_interval=0.1)
+        handler.handle(self.record("late"))
+
+        for _ in range(50):
+            if os.path.exists(self.path) and self.lines():
+                break
+            time.sleep(0.02)
+        self.assertEqual(self.lines(), ["WARNING late"])
+
+    def test_full_queue_drops_oldest(self):
+        handler      = self.handler(capacity=3)
+        handler.name = "test"
+        before       = REGISTRY.get_sample_value("seso_log_records_dropped_total", {"handler" : "test"}) or 0
+
+        with patch.object(handler.listener, "start"):
+            for i in range(5):
+                handler.handle(self.record(f"message {i}"))
+
+        self.assertEqual(handler.queue.dropped, 2)
+        self.assertEqual([record.getMessage() for record in handler.queue.records], ["WARNING message 2", "WARNING message 3", "WARNING message 4"])
+        self.assertEqual(REGISTRY.get_sample_value("seso_log_records_dropped_total", {"handler" : "test"}), before + 2)
+
+    def test_broken_sink_does_not_block_logging(self):
+        def broken_sink():
+            raise ConnectionError("CloudWatch is down")
+
+        handler      = QueuedHandler(broken_sink, batch_size=1, flush_interval=0.05)
+        handler.name = "broken"
+        self.addCleanup(handler.close)
+        before       = REGISTRY.get_sample_value("seso_log_records_dropped_total", {"handler" : "broken"}) or 0
+
+        with patch("sys.stderr", new_callable=io.StringIO) as stderr:
+            start = time.perf_counter()
+            for i in range(100):
+                handler.handle(self.record(f"message {i}"))
+            self.assertLess(time.perf_counter() - start, 0.5)
+            handler.close()
+
+        self.assertEqual(stderr.getvalue(), "")
+        self.assertEqual(REGISTRY.get_sample_value("seso_log_records_dropped_total", {"handler" : "broken"}), before + 100)
+
+    def test_tests_ship_to_file_sink(self):
+        self.assertEqual(settings.LOGGING["handlers"]["watchtower"]["sink"], "logging.FileHandler")
+
+class FakeConnection:
+    def __init__(self):
+        self.closed    = False
+        self.healthy   = True
+        self.rollbacks = 0
+        self.encoders  = {}
+
+    def ping(self, reconnect=True):
+        if not self.healthy:
+            raise ConnectionError("gone away")
+
+    def autocommit(self, value):
+        pass
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+class ConnectionPoolTest(TestCase):
+    def pool(self, name, **options):
+        self.created = []
+
+        def create():
+            self.created.append(FakeConnection())
+            return self.created[-1]
+
+        def check(connection):
+            connection.ping()
+            return True
+
+        return ConnectionPool(name, create, close=FakeConnection.close, check=check, **options)
+
+    def test_connections_reused(self):
+        pool = self.pool("reuse")
+        first = pool.acquire()
+        pool.release(first)
+
+        self.assertIs(pool.acquire(), first)
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual(pool.checkouts(first), 2)
+        self.assertEqual(pool.stats()["checked_out"], 1)
+        self.assertEqual(REGISTRY.get_sample_value("seso_db_pool_checked_out", {"alias" : "reuse"}), 1)
+
+    def test_bounded_with_timeout(self):
+        pool = self.pool("bounded", max_size=2, timeout=0.05)
+        pool.acquire(), pool.acquire()
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(len(self.created), 2)
+        self.assertEqual(pool.stats()["size"], 2)
+
+    def test_waiter_gets_released_connection(self):
+        pool   = self.pool("waiter", max_size=1, timeout=5)
+        first  = pool.acquire()
+        before = REGISTRY.get_sample_value("seso_db_pool_waits_total", {"alias" : "waiter"}) or 0
+
+        timer = threading.Timer(0.05, pool.release, [first])
+        timer.start()
+        self.assertIs(pool.acquire(), first)
+        timer.join()
+
+        self.assertEqual(pool.stats()["waits"], 1)
+        self.assertGreater(pool.stats()["wait_time_ms"], 0)
+        self.assertEqual(REGISTRY.get_sample_value("seso_db_pool_waits_total", {"alias" : "waiter"}), before + 1)
+
+    def test_expired_and_idle_connections_closed(self):
+        pool  = self.pool("expiry", max_lifetime=60, max_idle=10)
+        old   = pool.acquire()
+        idle  = pool.acquire()
+        pool.release(idle)
+
+        with patch("core.db.pool.time.monotonic", return_value=time.monotonic() + 30):
+            fresh = pool.acquire()
+        self.assertTrue(idle.closed)
+        self.assertIsNot(fresh, idle)
+
+        with patch("core.db.pool.time.monotonic", return_value=time.monotonic() + 90):
+            pool.release(old)
+        self.assertTrue(old.closed)
+        self.assertEqual(pool.stats(), {"size" : 1, "idle" : 0, "checked_out" : 1, "waits" : 0, "wait_time_ms" : 0})
+
+    def test_unhealthy_connection_replaced(self):
+        pool   = self.pool("health", check_after=0)
+        broken = pool.acquire()
+        pool.release(broken)
+        broken.healthy = False
+
+        replacement = pool.acquire()
+        self.assertIsNot(replacement, broken)
+        self.assertTrue(broken.closed)
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_failed_connect_frees_slot(self):
+        pool = ConnectionPool("failing", MagicMock(side_effect=[ConnectionError, FakeConnection()]), close=FakeConnection.close, max_size=1, timeout=0.05)
+
+        with self.assertRaises(ConnectionError):
+            pool.acquire()
+        self.assertIsInstance(pool.acquire(), FakeConnection)
+
+    def test_threads_share_bounded_pool(self):
+        pool  = self.pool("threads", max_size=3)
+        peaks = []
+
+        def work():
+            for _ in range(20):
+                connection = pool.acquire()
+                peaks.append(pool.stats()["checked_out"])
+                pool.release(connection)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertLessEqual(len(self.created), 3)
+        self.assertLessEqual(max(peaks), 3)
+        self.assertEqual(pool.stats()["checked_out"], 0)
+
+class PooledMySQLBackendTest(TestCase):
+    def setUp(self):
+        self.connections = []
+
+        def connect(**params):
+            self.connections.append(FakeConnection())
+            return self.connections[-1]
+
+        patch.dict(pooled_mysql.pools, clear=True).start()
+        patch.object(pooled_mysql.Database, "connect", side_effect=connect).start()
+        self.init_state = patch("django.db.backends.mysql.base.DatabaseWrapper.init_connection_state").start()
+        self.addCleanup(patch.stopall)
+
+        self.wrapper = pooled_mysql.DatabaseWrapper({
+            "ENGINE" : "core.db.backends.mysql", "NAME" : "seso", "USER" : "", "PASSWORD" : "", "HOST" : "", "PORT" : "",
+            "OPTIONS" : {}, "CONN_MAX_AGE" : 0, "AUTOCOMMIT" : True, "ATOMIC_REQUESTS" : False, "TIME_ZONE" : None,
+            "POOL" : {"MAX_SIZE" : 2},
+        }, alias="pooled")
+
+    def test_connection_returned_to_pool(self):
+        self.wrapper.connect()
+        first = self.wrapper.connection
+        self.wrapper.close()
+        self.wrapper.connect()
+
+        self.assertIs(self.wrapper.connection, first)
+        self.assertFalse(first.closed)
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(self.init_state.call_count, 1)
+        self.assertEqual(pooled_mysql.pools["pooled"].max_size, 2)
+
+    def test_open_transaction_rolled_back(self):
+        self.wrapper.connect()
+        self.wrapper.autocommit = False
+        self.wrapper.close()
+
+        self.assertEqual(self.connections[0].rollbacks, 1)
+        self.assertFalse(self.connections[0].closed)
+
+    def test_broken_connection_discarded(self):
+        self.wrapper.connect()
+        self.wrapper.errors_occurred = True
+        self.wrapper.close()
+
+        self.assertTrue(self.connections[0].closed)
+        self.assertEqual(pooled_mysql.pools["pooled"].stats()["size"], 0)
+
+@override_settings(DATABASE_REPLICAS = ["replica"])
+class ReplicaRouterTest(TransactionTestCase):
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.databases["replica"] = {
+            "ENGINE" : "django.db.backends.sqlite3",
+            "NAME"   : os.path.join(cls.directory.name, "replica.sqlite3"),
+        }
+        with connections["replica"].schema_editor() as editor:
+            for model in (Gallery, User, Posting):
+                editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.databases["replica"]
+        cls.directory.cleanup()
+
+    def setUp(self):
+        cache.clear()
+        self.gallery = Gallery.objects.create(name = "primary", image = "image.jpg")
+        self.user    = User.objects.create(kakao = "1")
+        self.token   = jwt.encode({"id" : self.user.id}, SECRET_KEY, algorithm = ALGORITHMS)
+
+    def sees_gallery(self, client, **headers):
+        return client.get(f"/galleries/{self.gallery.id}", **headers).status_code == 200
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(Gallery.objects.db, "replica")
+        self.assertFalse(Gallery.objects.exists())
+        self.assertTrue(Gallery.objects.using("default").exists())
+
+        with transaction.atomic():
+            self.assertTrue(Gallery.objects.exists())
+
+        token = read_database.set("default")
+        self.addCleanup(read_database.reset, token)
+        self.assertTrue(Gallery.objects.exists())
+
+    def test_write_pins_client_to_primary(self):
+        client = Client()
+        self.assertFalse(self.sees_gallery(client))
+
+        response = client.post(f"/galleries/{self.gallery.id}/bookmark", HTTP_AUTHORIZATION = self.token)
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("primary_pin", response.cookies)
+
+        self.assertTrue(self.sees_gallery(client))
+        self.assertTrue(self.sees_gallery(Client(), HTTP_X_PRIMARY_PIN = response["X-Primary-Pin"]))
+        self.assertFalse(self.sees_gallery(Client()))
+
+    def test_failed_write_does_not_pin(self):
+        response = Client().post("/galleries/0/bookmark", HTTP_AUTHORIZATION = self.token)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn("primary_pin", response.cookies)
+
+    def test_forged_or_expired_pin_ignored(self):
+        pin = Client().post(f"/galleries/{self.gallery.id}/bookmark", HTTP_AUTHORIZATION = self.token)["X-Primary-Pin"]
+
+        self.assertFalse(self.sees_gallery(Client(), HTTP_X_PRIMARY_PIN = pin[:-1]))
+        with patch("django.core.signing.time.time", return_value = time.time() + 60):
+            self.assertFalse(self.sees_gallery(Client(), HTTP_X_PRIMARY_PIN = pin))
+
+    def test_caches_filled_from_primary_after_write(self):
+        client   = Client()
+        response = client.post(f"/galleries/{self.gallery.id}/bookmark", HTTP_AUTHORIZATION = self.token)
+        Gallery.objects.create(name = "written", image = "image.jpg")
+        posting  = Posting.objects.create(gallery = self.gallery, title = "written", content = "content", user = self.user)
+
+        names = [gallery["gallery_name"] for gallery in Client().get("/galleries").json()["MESSAGE"]]
+        self.assertEqual(names, ["primary", "written"])
+        self.assertEqual(gallery_bounds(self.gallery.id), (posting.id, posting.id))
+
+        pinned = client.get("/galleries", HTTP_X_PRIMARY_PIN = response["X-Primary-Pin"])
+        self.assertEqual([gallery["gallery_name"] for gallery in pinned.json()["MESSAGE"]], ["primary", "written"])
+
+    def test_version_bumped_again_when_write_commits(self):
+        with transaction.atomic():
+            gallery_catalogue.invalidate()
+            during = cache.get(gallery_catalogue.version_key)
+            gallery_catalogue.get()
+
+        self.assertNotEqual(cache.get(gallery_catalogue.version_key), during)
+
+class SharedCacheTest(TestCase):
+    def test_memcached_used_when_configured(self):
+        with patch.dict(os.environ, {"MEMCACHED_LOCATION" : "memcached:11211"}):
+            configured = runpy.run_module("seso.settings")["CACHES"]["default"]
+
+        self.assertEqual(configured["BACKEND"], "django.core.cache.backends.memcached.PyMemcacheCache")
+        self.assertEqual(configured["LOCATION"], "memcached:11211")
+
+    def test_workers_need_shared_cache(self):
+        hooks  = runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), "gunicorn.conf.py"))
+        server = MagicMock()
+        server.cfg.workers = 4
+
+        with patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR" : ""}):
+            os.environ.pop("MEMCACHED_LOCATION", None)
+            with self.assertRaises(RuntimeError):
+                hooks["on_starting"](server)
+
+            server.cfg.workers = 1
+            hooks["on_starting"](server)
+
+@override_settings(UPLOAD_MAX_SIZE = 1024)
+class BoundedASGIHandlerTest(TestCase):
+    def communicate(self, headers, chunks):
+        scope = {
+            "type"         : "http",
+            "asgi"         : {"version" : "3.0"},
+            "http_version" : "1.1",
+            "method"       : "POST",
+            "scheme"       : "http",
+            "path"         : "/galleries/images",
+            "raw_path"     : b"/galleries/images",
+            "query_string" : b"",
+            "root_path"    : "",
+            "headers"      : [(b"content-type", b"multipart/form-data; boundary=x"), *headers],
+            "client"       : ("127.0.0.1", 50000),
+            "server"       : ("testserver", 80),
+        }
+
+        async def request():
+            communicator = ApplicationCommunicator(application, scope)
+            for index, chunk in enumerate(chunks):
+                await communicator.send_input({"type" : "http.request", "body" : chunk, "more_body" : index < len(chunks) - 1})
+            start = await communicator.receive_output(5)
+            body  = await communicator.receive_output(5)
+            return start["status"], json.loads(body["body"])
+
+        return asyncio.run(request())
+
+    def test_oversized_content_length_refused_before_reading(self):
+        with patch("galleries.views.ImageView.post") as view:
+            self.assertEqual(self.communicate([(b"content-length", b"2048")], []), (400, {"MESSAGE" : "FILE_TOO_LARGE"}))
+        view.assert_not_called()
+
+    def test_oversized_stream_refused_at_limit(self):
+        with patch("galleries.views.ImageView.post") as view:
+            self.assertEqual(self.communicate([], [b"0" * 512] * 4), (400, {"MESSAGE" : "FILE_TOO_LARGE"}))
+        view.assert_not_called()
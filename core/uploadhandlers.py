@@ -0,0 +1,107 @@
+import uuid
+
+from django.conf                     import settings
+from django.core.files.uploadedfile  import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.http                     import QueryDict
+from django.utils.datastructures     import MultiValueDict
+
+from core.metrics import S3_UPLOAD_DURATION, timed
+from core.utils   import get_s3_client
+from my_settings  import AWS_IAM_ACCESS_KEY_ID, AWS_IAM_SECRET_ACCESS_KEY, AWS_S3_STORAGE_BUCKET_NAME
+
+class S3UploadedFile(UploadedFile):
+    def __init__(self, key, name, content_type, size, charset, content_type_extra=None):
+        super().__init__(None, name, content_type, size, charset, content_type_extra)
+        self.key = key
+
+class S3UploadHandler(FileUploadHandler):
+    part_size = 5 * 1024 * 1024
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.s3_client = get_s3_client(AWS_IAM_ACCESS_KEY_ID, AWS_IAM_SECRET_ACCESS_KEY)
+        self.bucket    = AWS_S3_STORAGE_BUCKET_NAME
+        self.error     = None
+        self.upload_id = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > settings.UPLOAD_MAX_SIZE:
+            self.error = "FILE_TOO_LARGE"
+            return QueryDict(encoding=encoding), MultiValueDict()
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+
+        if not content_type.startswith(settings.UPLOAD_ALLOWED_CONTENT_TYPES):
+            self.error = "INVALID_CONTENT_TYPE"
+            raise StopUpload(connection_reset=True)
+
+        self.key       = str(uuid.uuid4()).replace("-","") + file_name
+        self.buffer    = bytearray()
+        self.parts     = []
+        self.upload_id = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.UPLOAD_MAX_SIZE:
+            self.error = "FILE_TOO_LARGE"
+            self.abort()
+            raise StopUpload(connection_reset=True)
+
+        self.buffer += raw_data
+        if len(self.buffer) >= self.part_size:
+            self.upload_part()
+
+    def file_complete(self, file_size):
+        if self.upload_id is None:
+            with timed(S3_UPLOAD_DURATION, operation="put_object"):
+                self.s3_client.put_object(
+                    Bucket       = self.bucket,
+                    Key          = self.key,
+                    Body         = bytes(self.buffer),
+                    ContentType  = self.content_type,
+                    CacheControl = settings.AWS_S3_CACHE_CONTROL
+                )
+        else:
+            if self.buffer:
+                self.upload_part()
+            with timed(S3_UPLOAD_DURATION, operation="complete_multipart_upload"):
+                self.s3_client.complete_multipart_upload(
+                    Bucket          = self.bucket,
+                    Key             = self.key,
+                    UploadId        = self.upload_id,
+                    MultipartUpload = {"Parts" : self.parts}
+                )
+            self.upload_id = None
+
+        self.buffer = bytearray()
+        return S3UploadedFile(self.key, self.file_name, self.content_type, file_size, self.charset, self.content_type_extra)
+
+    def upload_interrupted(self):
+        self.abort()
+
+    def upload_part(self):
+        if self.upload_id is None:
+            self.upload_id = self.s3_client.create_multipart_upload(
+                Bucket       = self.bucket,
+                Key          = self.key,
+                ContentType  = self.content_type,
+                CacheControl = settings.AWS_S3_CACHE_CONTROL
+            )["UploadId"]
+
+        part_number = len(self.parts) + 1
+        with timed(S3_UPLOAD_DURATION, operation="upload_part"):
+            response = self.s3_client.upload_part(
+                Bucket     = self.bucket,
+                Key        = self.key,
+                UploadId   = self.upload_id,
+                PartNumber = part_number,
+                Body       = bytes(self.buffer)
+            )
+        self.parts.append({"ETag" : response["ETag"], "PartNumber" : part_number})
+        self.buffer = bytearray()
+
+    def abort(self):
+        if self.upload_id is not None:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            self.upload_id = None
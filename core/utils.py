@@ -1,24 +1,109 @@
-import boto3, uuid
+import base64, binascii, boto3, hashlib, json, threading, uuid
+
+from botocore.config        import Config
+from django.conf            import settings
+from django.core.cache      import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db              import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models       import Q
+
+from core.metrics import S3_UPLOAD_DURATION, timed
+
+s3_clients     = {}
+s3_client_lock = threading.Lock()
+
+def get_s3_client(id, password):
+    with s3_client_lock:
+        if (id, password) not in s3_clients:
+            s3_clients[(id, password)] = boto3.client(
+                "s3",
+                aws_access_key_id     = id,
+                aws_secret_access_key = password,
+                endpoint_url          = settings.AWS_S3_ENDPOINT_URL,
+                config                = Config(max_pool_connections = settings.AWS_S3_MAX_POOL_CONNECTIONS)
+            )
+        return s3_clients[(id, password)]
 
 class CloudStorage:
     def __init__(self, id, password, bucket):
         self.id        = id
         self.password  = password
         self.bucket    = bucket
-        self.s3_client = boto3.client(
-            "s3",
-            aws_access_key_id     = self.id,
-            aws_secret_access_key = self.password
-        )
+        self.s3_client = get_s3_client(self.id, self.password)
 
     def upload_file(self, image):
         upload_key = str(uuid.uuid4()).replace("-","") + image.name
-        self.s3_client.upload_fileobj(
-            image,
-            self.bucket,
-            upload_key,
-            ExtraArgs = {
-                "ContentType": image.content_type
-            }
-        )
+        with timed(S3_UPLOAD_DURATION, operation="upload_fileobj"):
+            self.s3_client.upload_fileobj(
+                image,
+                self.bucket,
+                upload_key,
+                ExtraArgs = {
+                    "ContentType"  : image.content_type,
+                    "CacheControl" : settings.AWS_S3_CACHE_CONTROL
+                }
+            )
         return upload_key
+
+def stored_version(key, timeout=None):
+    version = cache.get(key)
+
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, timeout):
+            version = cache.get(key)
+    return version
+
+def cache_version(key, timeout=None):
+    return stored_version(key, timeout) or uuid.uuid4().hex
+
+def bump_cache_version(key, timeout=None):
+    cache.set(key, uuid.uuid4().hex, timeout)
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, timeout))
+
+def make_etag(*parts):
+    return hashlib.md5(json.dumps(parts, default=str).encode()).hexdigest()
+
+class InvalidCursor(Exception):
+    pass
+
+class CursorPaginator:
+    def __init__(self, object_list, per_page, ordering=("created_at", "id")):
+        self.object_list = object_list
+        self.per_page    = per_page
+        self.ordering    = ordering
+
+    def get_page(self, cursor):
+        queryset = self.object_list.order_by(*self.ordering)
+
+        if cursor:
+            queryset = queryset.filter(self.seek(self.decode(cursor)))
+
+        objects     = list(queryset[:self.per_page + 1])
+        next_cursor = self.encode(objects[self.per_page - 1]) if len(objects) > self.per_page else None
+        return objects[:self.per_page], next_cursor
+
+    def seek(self, values):
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            equals     = dict(zip(self.ordering[:i], values[:i]))
+            condition |= Q(**equals, **{f"{field}__gt" : values[i]})
+        return condition
+
+    def encode(self, obj):
+        values = [obj[field] if isinstance(obj, dict) else getattr(obj, field) for field in self.ordering]
+        values = [value.isoformat() if hasattr(value, "isoformat") else value for value in values]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+    def decode(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise InvalidCursor(cursor)
+
+            model = self.object_list.model
+            return [model._meta.get_field(field).to_python(value) for field, value in zip(self.ordering, values)]
+
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, FieldDoesNotExist, ValidationError):
+            raise InvalidCursor(cursor)
@@ -1,3 +1,17 @@
-from django.shortcuts import render
+import asyncio
 
-# Create your views here.
+from functools     import update_wrapper
+from django.views import View
+
+class AsyncView(View):
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+
+        return update_wrapper(async_view, view)
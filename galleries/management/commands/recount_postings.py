@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db                   import transaction
+from django.db.models            import Max, Min
+
+from galleries.models import Posting
+from galleries.utils  import posting_counters
+
+class Command(BaseCommand):
+    help = "Recompute comment_count, like_count and view_count on every posting"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        bounds     = Posting.objects.aggregate(first=Min("id"), last=Max("id"))
+        updated    = 0
+
+        if bounds["first"] is None:
+            self.stdout.write("No postings to recount")
+            return
+
+        for start in range(bounds["first"], bounds["last"] + 1, batch_size):
+            with transaction.atomic():
+                updated += Posting.objects.filter(id__gte=start, id__lt=start + batch_size).update(**posting_counters())
+
+        self.stdout.write(self.style.SUCCESS(f"Recounted {updated} postings"))
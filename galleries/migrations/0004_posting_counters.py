@@ -0,0 +1,47 @@
+# Generated by Django 3.2.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_postings(apps, schema_editor):
+    Posting   = apps.get_model('galleries', 'Posting')
+    Comment   = apps.get_model('galleries', 'Comment')
+    Like      = apps.get_model('galleries', 'Like')
+    Viewcount = apps.get_model('galleries', 'Viewcount')
+
+    def total(model, aggregate):
+        rows = model.objects.filter(posting=OuterRef('pk')).order_by().values('posting')
+        return Coalesce(Subquery(rows.annotate(total=aggregate).values('total')), 0)
+
+    Posting.objects.update(
+        comment_count=total(Comment, Count('id')),
+        like_count=total(Like, Count('id')),
+        view_count=total(Viewcount, Sum('view_count')),
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('galleries', '0003_like'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='posting',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='posting',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='posting',
+            name='view_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_postings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.7 on 2026-10-18 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('galleries', '0004_posting_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['gallery', 'created_at', 'id'], name='postings_gallery_created_idx'),
+        ),
+    ]
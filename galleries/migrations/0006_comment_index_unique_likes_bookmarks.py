@@ -0,0 +1,51 @@
+# Generated by Django 3.2.7 on 2026-10-18 17:03
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicates(model, field):
+    duplicates = list(
+        model.objects.order_by().values('user', field)
+        .annotate(keep=Min('id'), rows=Count('id')).filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        model.objects.filter(user=duplicate['user'], **{field: duplicate[field]}).exclude(id=duplicate['keep']).delete()
+    return {duplicate[field] for duplicate in duplicates}
+
+def dedupe_likes_and_bookmarks(apps, schema_editor):
+    Posting  = apps.get_model('galleries', 'Posting')
+    Like     = apps.get_model('galleries', 'Like')
+    Bookmark = apps.get_model('galleries', 'Bookmark')
+
+    remove_duplicates(Bookmark, 'gallery')
+    posting_ids = remove_duplicates(Like, 'posting')
+
+    likes = Like.objects.filter(posting=OuterRef('pk')).order_by().values('posting')
+    Posting.objects.filter(id__in=posting_ids).update(
+        like_count=Coalesce(Subquery(likes.annotate(total=Count('id')).values('total')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('galleries', '0005_posting_gallery_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_likes_and_bookmarks, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['posting', 'created_at', 'id'], name='comments_posting_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookmark',
+            constraint=models.UniqueConstraint(fields=('user', 'gallery'), name='bookmarks_user_gallery_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('user', 'posting'), name='likes_user_posting_uniq'),
+        ),
+    ]
@@ -10,14 +10,20 @@ class Gallery(models.Model):
         db_table = 'galleries'
 
 class Posting(TimeStampModel):
-    gallery    = models.ForeignKey('gallery', on_delete=models.CASCADE)
-    title      = models.CharField(max_length=100)
-    content    = models.CharField(max_length=2000)
-    user       = models.ForeignKey('users.user', on_delete=models.CASCADE)
-    thumbnail  = models.URLField(max_length=2000, null=True)
+    gallery       = models.ForeignKey('gallery', on_delete=models.CASCADE)
+    title         = models.CharField(max_length=100)
+    content       = models.CharField(max_length=2000)
+    user          = models.ForeignKey('users.user', on_delete=models.CASCADE)
+    thumbnail     = models.URLField(max_length=2000, null=True)
+    comment_count = models.PositiveIntegerField(default=0)
+    like_count    = models.PositiveIntegerField(default=0)
+    view_count    = models.PositiveIntegerField(default=0)
 
     class Meta:
         db_table = 'postings'
+        indexes  = [
+            models.Index(fields=['gallery', 'created_at', 'id'], name='postings_gallery_created_idx'),
+        ]
 
 class Comment(TimeStampModel):
     user    = models.ForeignKey('users.user', on_delete=models.CASCADE)
@@ -26,13 +32,19 @@ class Comment(TimeStampModel):
 
     class Meta:
         db_table = 'comments'
+        indexes  = [
+            models.Index(fields=['posting', 'created_at', 'id'], name='comments_posting_created_idx'),
+        ]
 
 class Bookmark(models.Model):
     user    = models.ForeignKey('users.user', on_delete=models.CASCADE)
     gallery = models.ForeignKey('gallery', on_delete=models.CASCADE)
 
     class Meta:
-        db_table = 'bookmarks'
+        db_table    = 'bookmarks'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'gallery'], name='bookmarks_user_gallery_uniq'),
+        ]
 
 class Viewcount(models.Model):
     posting    = models.ForeignKey('posting', on_delete=models.CASCADE)
@@ -46,4 +58,7 @@ class Like(models.Model):
     user    = models.ForeignKey('users.user', on_delete=models.CASCADE)
 
     class Meta:
-        db_table = 'likes'
\ No newline at end of file
+        db_table    = 'likes'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'posting'], name='likes_user_posting_uniq'),
+        ]
@@ -0,0 +1,67 @@
+from django.core.signals      import request_finished
+from django.db.models         import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch          import receiver
+
+from core.images      import derivatives_created
+from galleries.models import Gallery, Posting, Comment, Like, Bookmark
+from galleries.utils  import attach_thumbnail, bump_versions, clear_gallery_bounds, gallery_catalogue, view_counter
+
+def increase(posting_id, counter):
+    Posting.objects.filter(id=posting_id).update(**{counter : F(counter) + 1})
+
+def decrease(posting_id, counter):
+    Posting.objects.filter(id=posting_id, **{f"{counter}__gt" : 0}).update(**{counter : F(counter) - 1})
+
+def comment_changed(instance):
+    bump_versions("comments-version", [instance.posting_id])
+    bump_versions("postings-version", Posting.objects.filter(id=instance.posting_id).values_list("gallery_id", flat=True))
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        increase(instance.posting_id, "comment_count")
+    comment_changed(instance)
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    decrease(instance.posting_id, "comment_count")
+    comment_changed(instance)
+
+@receiver(post_save, sender=Like)
+def like_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        increase(instance.posting_id, "like_count")
+
+@receiver(post_delete, sender=Like)
+def like_deleted(sender, instance, **kwargs):
+    decrease(instance.posting_id, "like_count")
+
+@receiver(post_save, sender=Posting)
+def posting_saved(sender, instance, created, **kwargs):
+    if created:
+        clear_gallery_bounds(instance.gallery_id)
+    bump_versions("postings-version", [instance.gallery_id])
+
+@receiver(post_delete, sender=Posting)
+def posting_deleted(sender, instance, **kwargs):
+    clear_gallery_bounds(instance.gallery_id)
+    bump_versions("postings-version", [instance.gallery_id])
+
+@receiver(post_save, sender=Bookmark)
+@receiver(post_delete, sender=Bookmark)
+def bookmark_changed(sender, instance, **kwargs):
+    bump_versions("bookmarks-version", [instance.user_id])
+
+@receiver(post_save, sender=Gallery)
+@receiver(post_delete, sender=Gallery)
+def gallery_changed(sender, instance, **kwargs):
+    gallery_catalogue.invalidate()
+
+@receiver(derivatives_created)
+def thumbnail_ready(sender, url, **kwargs):
+    attach_thumbnail(url)
+
+@receiver(request_finished)
+def flush_view_counts(sender, **kwargs):
+    view_counter.flush_if_due()
@@ -1,13 +1,23 @@
+import io
 import jwt
 import json
 
-from django.test                    import TestCase, Client
+from django.core.cache              import cache
+from django.core.management         import call_command
+from django.db                      import DatabaseError, connection
+from django.test                    import TestCase, Client, override_settings
+from django.test.utils              import CaptureQueriesContext
 from django.core.files.uploadedfile import SimpleUploadedFile
 from unittest.mock                  import patch, MagicMock
 
 from users.models       import User
 from galleries.models   import Gallery, Posting, Comment, Bookmark, Viewcount, Like
-from my_settings        import SECRET_KEY, ALGORITHMS
+from galleries.utils    import view_counter
+from users.profile       import profile_version
+from core.images         import ready_key
+from core.queryplan      import full_table_scans
+from core.uploadhandlers import S3UploadHandler
+from my_settings        import SECRET_KEY, ALGORITHMS, AWS_S3_BUCKET_URL
 
 
 class BookmarkTest(TestCase):
@@ -165,8 +175,9 @@ class PostingListTest(TestCase):
         response   = client.get(f"/galleries/{gallery_id}?page=1")
         self.assertEqual(response.status_code, 200)
 
+    @patch("galleries.views.queue_derivatives")
     @patch("core.utils.boto3.client")
-    def test_posting_image_success(self, mocked_requests) :
+    def test_posting_image_success(self, mocked_requests, mocked_derivatives) :
         client = Client()
     
         class MockedResponse :
@@ -202,6 +213,28 @@ class PostingListTest(TestCase):
         
         response = client.post(f"/galleries/{gallery.id}", body, **header)
         self.assertEqual(response.status_code, 201)
+
+    def test_posting_post_thumbnail_derivative(self) :
+        client       = Client()
+        user         = User.objects.get(nickname = "Jun").id
+        access_token = jwt.encode({"id" : user}, SECRET_KEY, algorithm = ALGORITHMS)
+        gallery      = Gallery.objects.all()[0]
+
+        header = {"HTTP_Authorization" : access_token}
+        body   = {
+            "title"   : "Test",
+            "content" : f"![]({AWS_S3_BUCKET_URL}abc.jpeg) 사진입니다."
+        }
+
+        cache.delete(ready_key("abc.jpeg"))
+        response = client.post(f"/galleries/{gallery.id}", body, **header)
+        posting  = Posting.objects.get(id = response.json()["POSTING_ID"])
+        self.assertEqual(posting.thumbnail, f"{AWS_S3_BUCKET_URL}abc.jpeg")
+
+        cache.set(ready_key("abc.jpeg"), True)
+        response = client.post(f"/galleries/{gallery.id}", body, **header)
+        posting  = Posting.objects.get(id = response.json()["POSTING_ID"])
+        self.assertEqual(posting.thumbnail, f"{AWS_S3_BUCKET_URL}derivatives/thumbnail/abc.webp")
         
 class PostingTest(TestCase) :
     @classmethod
@@ -493,4 +526,597 @@ class PostingLikeTest(TestCase) :
         self.assertEqual(response.status_code, 201)
         
         response     = client.post(f"/galleries/{gallery_id}/{posting_id}/like", **header)
-        self.assertEqual(response.status_code, 204)
\ No newline at end of file
+        self.assertEqual(response.status_code, 204)
+
+class BatchToggleTest(TestCase) :
+    @classmethod
+    def setUpTestData(self) :
+        self.user      = User.objects.create(nickname = "testuser1")
+        self.galleries = [Gallery.objects.create(name = f"test{i}", image = "image.jpg") for i in range(3)]
+        self.postings  = [
+            Posting.objects.create(gallery = self.galleries[0], title = f"testpost{i}", content = "testtext", user = self.user)
+            for i in range(3)
+        ]
+
+    def setUp(self) :
+        cache.clear()
+        self.client = Client()
+        self.header = {"HTTP_Authorization" : jwt.encode({"id" : self.user.id}, SECRET_KEY, algorithm = ALGORITHMS)}
+
+    def post(self, path, states) :
+        return self.client.post(path, json.dumps({"states" : states}), content_type = "application/json", **self.header)
+
+    def test_likes_applied_in_one_batch(self) :
+        first, second, third = self.postings
+        Like.objects.create(user = self.user, posting = first)
+        Like.objects.create(user = self.user, posting = second)
+        version = profile_version(self.user.id)
+
+        with CaptureQueriesContext(connection) as captured :
+            response = self.post("/galleries/likes", {first.id : False, second.id : True, third.id : True})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["MESSAGE"], {str(first.id) : False, str(second.id) : True, str(third.id) : True})
+        self.assertEqual(set(Like.objects.values_list("posting_id", flat = True)), {second.id, third.id})
+        self.assertEqual(
+            dict(Posting.objects.values_list("id", "like_count")),
+            {first.id : 0, second.id : 1, third.id : 1}
+        )
+        self.assertNotEqual(profile_version(self.user.id), version)
+
+        statements = [query["sql"] for query in captured.captured_queries if not query["sql"].startswith(("SAVEPOINT", "RELEASE"))]
+        self.assertEqual(len([sql for sql in statements if sql.startswith("INSERT")]), 1)
+        self.assertEqual(len([sql for sql in statements if sql.startswith("DELETE")]), 1)
+
+    def test_unknown_posting_changes_nothing(self) :
+        response = self.post("/galleries/likes", {self.postings[0].id : True, 0 : True})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["MESSAGE"], "POSTING_DOES_NOT_EXIST")
+        self.assertFalse(Like.objects.exists())
+
+    def test_invalid_states_rejected(self) :
+        self.assertEqual(self.post("/galleries/likes", {self.postings[0].id : "yes"}).json()["MESSAGE"], "INVALID_STATES")
+        self.assertEqual(self.post("/galleries/likes", [self.postings[0].id]).json()["MESSAGE"], "INVALID_STATES")
+        self.assertEqual(self.client.post("/galleries/likes", "{}", content_type = "application/json", **self.header).json()["MESSAGE"], "KEY_ERROR")
+
+        with override_settings(BATCH_TOGGLE_MAX_ITEMS = 2) :
+            response = self.post("/galleries/likes", {posting.id : True for posting in self.postings})
+        self.assertEqual(response.json()["MESSAGE"], "TOO_MANY_ITEMS")
+
+    def test_non_object_body_rejected(self) :
+        for path in ("/galleries/likes", "/galleries/bookmarks") :
+            for body in ("[]", '"x"', "null", "1") :
+                response = self.client.post(path, body, content_type = "application/json", **self.header)
+                self.assertEqual(response.status_code, 400, (path, body))
+                self.assertEqual(response.json()["MESSAGE"], "INVALID_STATES", (path, body))
+
+    def test_bookmarks_applied_in_one_batch(self) :
+        first, second, third = self.galleries
+        Bookmark.objects.create(user = self.user, gallery = first)
+        listed = self.client.get("/galleries/bookmark-list", **self.header)
+
+        response = self.post("/galleries/bookmarks", {first.id : False, second.id : True, third.id : False})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["MESSAGE"], {str(first.id) : False, str(second.id) : True, str(third.id) : False})
+        self.assertEqual(list(Bookmark.objects.values_list("gallery_id", flat = True)), [second.id])
+
+        response = self.client.get("/galleries/bookmark-list", HTTP_IF_NONE_MATCH = listed["ETag"], **self.header)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], listed["ETag"])
+
+        response = self.post("/galleries/bookmarks", {second.id : True})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Bookmark.objects.count(), 1)
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL = 60, VIEW_COUNT_MAX_PENDING = 1000)
+class ViewCountBufferTest(TestCase) :
+    @classmethod
+    def setUpTestData(self) :
+        gallery = Gallery.objects.create(
+            name  = "test",
+            image = "image.jpg"
+        )
+        user    = User.objects.create(nickname = "testuser1")
+        posting = Posting.objects.create(
+            gallery = gallery,
+            title   = "testpost1",
+            content = "testtext1",
+            user    = user
+        )
+        Viewcount.objects.create(posting = posting)
+
+    def setUp(self) :
+        view_counter.pending.clear()
+        view_counter.flush()
+
+    def test_posting_view_count_buffered(self) :
+        client  = Client()
+        posting = Posting.objects.get(title = "testpost1")
+
+        for expected in (1, 2, 3) :
+            response = client.get(f"/galleries/{posting.gallery_id}/{posting.id}")
+            self.assertEqual(response.json()["MESSAGE"]["view_count"], expected)
+
+        self.assertEqual(Viewcount.objects.get(posting = posting).view_count, 0)
+
+        view_counter.flush()
+
+        self.assertEqual(Viewcount.objects.get(posting = posting).view_count, 3)
+        self.assertEqual(view_counter.get(posting.id, 3), 3)
+
+    def test_view_count_flush_is_batched(self) :
+        posting = Posting.objects.get(title = "testpost1")
+        view_counter.increment(posting.id)
+        view_counter.increment(posting.id)
+
+        with CaptureQueriesContext(connection) as queries :
+            view_counter.flush()
+
+        updates = [query for query in queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(Viewcount.objects.get(posting = posting).view_count, 2)
+        self.assertEqual(Posting.objects.get(id = posting.id).view_count, 2)
+
+    def test_committed_flush_not_requeued_when_bump_fails(self) :
+        posting = Posting.objects.get(title = "testpost1")
+        view_counter.increment(posting.id)
+
+        with patch("galleries.utils.bump_versions", side_effect = ConnectionError("memcached is down")), \
+             patch("galleries.utils.logger") as logger :
+            view_counter.flush()
+        view_counter.flush()
+
+        self.assertEqual(view_counter.pending, {})
+        self.assertEqual(Viewcount.objects.get(posting = posting).view_count, 1)
+        logger.exception.assert_called_once()
+
+    @override_settings(VIEW_COUNT_FLUSH_INTERVAL = 0)
+    def test_due_counts_flushed_when_request_finishes(self) :
+        posting = Posting.objects.get(title = "testpost1")
+
+        Client().get(f"/galleries/{posting.gallery_id}/{posting.id}")
+
+        self.assertEqual(view_counter.pending, {})
+        self.assertEqual(Viewcount.objects.get(posting = posting).view_count, 1)
+
+    @override_settings(VIEW_COUNT_FLUSH_INTERVAL = 0)
+    def test_failed_flush_logged_and_kept(self) :
+        posting = Posting.objects.get(title = "testpost1")
+        view_counter.increment(posting.id)
+
+        with patch("galleries.utils.Viewcount.objects.filter", side_effect = DatabaseError("database is down")), \
+             patch("galleries.utils.logger") as logger :
+            view_counter.flush_if_due()
+
+        logger.exception.assert_called_once()
+        self.assertEqual(view_counter.pending, {posting.id : 1})
+
+class CursorPaginationTest(TestCase) :
+    @classmethod
+    def setUpTestData(self) :
+        gallery = Gallery.objects.create(
+            name  = "test",
+            image = "image.jpg"
+        )
+        user    = User.objects.create(nickname = "testuser1")
+
+        Posting.objects.bulk_create([
+            Posting(
+                gallery = gallery,
+                title   = f"testpost{i}",
+                content = f"testtext{i}",
+                user    = user
+            ) for i in range(25)
+        ])
+        Viewcount.objects.bulk_create([Viewcount(posting = posting) for posting in Posting.objects.all()])
+
+        posting = Posting.objects.get(title = "testpost0")
+        Comment.objects.bulk_create([
+            Comment(
+                user    = user,
+                content = f"comment{i}",
+                posting = posting
+            ) for i in range(15)
+        ])
+
+        Posting.objects.filter(id__lt = posting.id + 12).update(created_at = "2021-10-01 10:00:00")
+
+    def walk(self, url) :
+        client, ids, cursor = Client(), [], ""
+
+        while cursor is not None :
+            response = client.get(url, {"cursor" : cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["IS_NEXT"], response.json()["NEXT_CURSOR"] is not None)
+            ids    += [row["id"] for row in response.json()["MESSAGE"]]
+            cursor  = response.json()["NEXT_CURSOR"]
+
+        return ids
+
+    def test_postings_cursor_walk(self) :
+        gallery  = Gallery.objects.get(name = "test")
+        expected = list(Posting.objects.filter(gallery = gallery).order_by("created_at", "id").values_list("id", flat = True))
+
+        self.assertEqual(self.walk(f"/galleries/{gallery.id}"), expected)
+
+    def test_comments_cursor_walk(self) :
+        posting  = Posting.objects.get(title = "testpost0")
+        expected = list(Comment.objects.filter(posting = posting).order_by("created_at", "id").values_list("id", flat = True))
+
+        self.assertEqual(self.walk(f"/galleries/{posting.gallery_id}/{posting.id}/comments"), expected)
+
+    def test_postings_page_query_count(self) :
+        client  = Client()
+        gallery = Gallery.objects.get(name = "test")
+
+        with self.assertNumQueries(2) :
+            response = client.get(f"/galleries/{gallery.id}", {"page" : 2})
+
+        self.assertEqual(len(response.json()["MESSAGE"]), 10)
+        self.assertEqual(response.json()["IS_NEXT"], True)
+        self.assertEqual(set(response.json()["MESSAGE"][0]), {
+            "id", "title", "thumbnail", "view_count", "created_at", "updated_at",
+            "comment_count", "user_nickname", "user_id"
+        })
+
+        with self.assertNumQueries(1) :
+            response = client.get(f"/galleries/{gallery.id}", {"cursor" : ""})
+
+        self.assertEqual(len(response.json()["MESSAGE"]), 10)
+
+    def test_postings_unknown_gallery(self) :
+        client   = Client()
+        response = client.get("/galleries/0")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"MESSAGE" : "KEY_ERROR"})
+
+    def test_postings_invalid_cursor(self) :
+        client   = Client()
+        gallery  = Gallery.objects.get(name = "test")
+        response = client.get(f"/galleries/{gallery.id}", {"cursor" : "not-a-cursor"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"MESSAGE" : "INVALID_CURSOR"})
+
+class PostingCounterTest(TestCase) :
+    @classmethod
+    def setUpTestData(self) :
+        gallery = Gallery.objects.create(
+            name  = "test",
+            image = "image.jpg"
+        )
+        user    = User.objects.create(nickname = "testuser1")
+        Posting.objects.create(
+            gallery = gallery,
+            title   = "testpost1",
+            content = "testtext1",
+            user    = user
+        )
+
+    def test_comment_count_follows_comments(self) :
+        client       = Client()
+        user         = User.objects.get(nickname = "testuser1")
+        posting      = Posting.objects.get(title = "testpost1")
+        access_token = jwt.encode({"id" : user.id}, SECRET_KEY, algorithm = ALGORITHMS)
+        headers      = {"HTTP_Authorization" : access_token}
+
+        for content in ("first", "second") :
+            client.post(f"/galleries/{posting.gallery_id}/{posting.id}/comments", json.dumps({"content" : content}),
+                        content_type = "application/json", **headers)
+        posting.refresh_from_db()
+        self.assertEqual(posting.comment_count, 2)
+
+        comment = Comment.objects.filter(posting = posting).first()
+        client.delete(f"/galleries/{posting.gallery_id}/{posting.id}/comments/{comment.id}", **headers)
+        posting.refresh_from_db()
+        self.assertEqual(posting.comment_count, 1)
+
+    def test_like_count_follows_likes(self) :
+        client       = Client()
+        user         = User.objects.get(nickname = "testuser1")
+        posting      = Posting.objects.get(title = "testpost1")
+        access_token = jwt.encode({"id" : user.id}, SECRET_KEY, algorithm = ALGORITHMS)
+        headers      = {"HTTP_Authorization" : access_token}
+
+        client.post(f"/galleries/{posting.gallery_id}/{posting.id}/like", **headers)
+        posting.refresh_from_db()
+        self.assertEqual(posting.like_count, 1)
+
+        client.post(f"/galleries/{posting.gallery_id}/{posting.id}/like", **headers)
+        posting.refresh_from_db()
+        self.assertEqual(posting.like_count, 0)
+
+    def test_recount_postings_repairs_counters(self) :
+        user    = User.objects.get(nickname = "testuser1")
+        posting = Posting.objects.get(title = "testpost1")
+
+        Comment.objects.bulk_create([Comment(user = user, posting = posting, content = "comment")] * 3)
+        Like.objects.bulk_create([Like(user = user, posting = posting)])
+        Viewcount.objects.create(posting = posting, view_count = 7)
+        Posting.objects.filter(id = posting.id).update(comment_count = 10, like_count = 10, view_count = 0)
+
+        call_command("recount_postings", stdout = io.StringIO())
+
+        posting.refresh_from_db()
+        self.assertEqual((posting.comment_count, posting.like_count, posting.view_count), (3, 1, 7))
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL = 60, VIEW_COUNT_MAX_PENDING = 1000)
+class PostingNeighbourTest(TestCase) :
+    @classmethod
+    def setUpTestData(self) :
+        gallery = Gallery.objects.create(
+            name  = "test",
+            image = "image.jpg"
+        )
+        user    = User.objects.create(nickname = "testuser1")
+
+        for i in range(3) :
+            Posting.objects.create(
+                gallery = gallery,
+                title   = f"testpost{i}",
+                content = f"testtext{i}",
+                user    = user
+            )
+
+    def setUp(self) :
+        cache.clear()
+        view_counter.pending.clear()
+        view_counter.flush()
+
+    def test_posting_neighbours(self) :
+        client = Client()
+        first, middle, last = Posting.objects.order_by("created_at", "id")
+
+        response = client.get(f"/galleries/{middle.gallery_id}/{middle.id}").json()["MESSAGE"]
+        self.assertEqual((response["prev_id"], response["next_id"]), (first.id, last.id))
+        self.assertEqual((response["first"], response["last"]), (False, False))
+
+        response = client.get(f"/galleries/{first.gallery_id}/{first.id}").json()["MESSAGE"]
+        self.assertEqual((response["prev_id"], response["next_id"]), (None, middle.id))
+        self.assertEqual((response["first"], response["last"]), (True, False))
+
+        with self.assertNumQueries(2) :
+            response = client.get(f"/galleries/{last.gallery_id}/{last.id}").json()["MESSAGE"]
+        self.assertEqual((response["prev_id"], response["next_id"]), (middle.id, None))
+        self.assertEqual((response["first"], response["last"]), (False, True))
+
+    def test_posting_neighbours_after_new_posting(self) :
+        client = Client()
+        last   = Posting.objects.order_by("created_at", "id").last()
+
+        client.get(f"/galleries/{last.gallery_id}/{last.id}")
+        newest = Posting.objects.create(
+            gallery = last.gallery,
+            title   = "testpost3",
+            content = "testtext3",
+            user    = last.user
+        )
+
+        response = client.get(f"/galleries/{last.gallery_id}/{last.id}").json()["MESSAGE"]
+        self.assertEqual(response["next_id"], newest.id)
+        self.assertEqual(response["last"], False)
+
+class ImageUploadTest(TestCase) :
+    def setUp(self) :
+        user        = User.objects.create(nickname = "testuser1")
+        self.header = {"HTTP_Authorization" : jwt.encode({"id" : user.id}, SECRET_KEY, algorithm = ALGORITHMS)}
+
+    def upload(self, content, content_type = "image/jpeg") :
+        image = SimpleUploadedFile(name = "test.jpeg", content = content, content_type = content_type)
+        return Client().post("/galleries/images", {"image" : image}, **self.header)
+
+    @patch("galleries.views.queue_derivatives")
+    @patch("core.uploadhandlers.get_s3_client")
+    def test_small_image_single_put(self, mocked_client, mocked_derivatives) :
+        response = self.upload(b"file_content")
+        s3       = mocked_client.return_value
+        key      = s3.put_object.call_args.kwargs["Key"]
+
+        mocked_derivatives.assert_called_once_with(key)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["MESSAGE"].rsplit("/", 1)[-1], key)
+        self.assertEqual(s3.put_object.call_args.kwargs["Body"], b"file_content")
+        s3.create_multipart_upload.assert_not_called()
+
+    @patch.object(S3UploadHandler, "part_size", 4)
+    @patch("galleries.views.queue_derivatives")
+    @patch("core.uploadhandlers.get_s3_client")
+    def test_large_image_multipart(self, mocked_client, mocked_derivatives) :
+        s3 = mocked_client.return_value
+        s3.create_multipart_upload.return_value = {"UploadId" : "upload"}
+        s3.upload_part.return_value             = {"ETag" : "etag"}
+
+        response = self.upload(b"0123456789")
+        parts    = [call.kwargs["Body"] for call in s3.upload_part.call_args_list]
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(b"".join(parts), b"0123456789")
+        self.assertEqual(len(s3.complete_multipart_upload.call_args.kwargs["MultipartUpload"]["Parts"]), len(parts))
+        s3.put_object.assert_not_called()
+
+    @patch("core.uploadhandlers.get_s3_client")
+    def test_invalid_content_type(self, mocked_client) :
+        response = self.upload(b"#!/bin/sh", content_type = "application/x-sh")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"MESSAGE" : "INVALID_CONTENT_TYPE"})
+        mocked_client.return_value.put_object.assert_not_called()
+
+    @override_settings(UPLOAD_MAX_SIZE = 100)
+    @patch("core.uploadhandlers.get_s3_client")
+    def test_image_too_large(self, mocked_client) :
+        response = self.upload(b"0" * 1000)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"MESSAGE" : "FILE_TOO_LARGE"})
+        mocked_client.return_value.put_object.assert_not_called()
+
+class GalleryCatalogueTest(TestCase) :
+    def setUp(self) :
+        cache.clear()
+        Gallery.objects.create(name = "경제", image = "abc.jpg")
+
+    def test_gallery_list_from_snapshot(self) :
+        client = Client()
+        client.get("/galleries")
+
+        with self.assertNumQueries(0) :
+            response = client.get("/galleries")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual([gallery["gallery_name"] for gallery in response.json()["MESSAGE"]], ["경제"])
+
+    def test_gallery_list_rebuilt_on_change(self) :
+        client = Client()
+        client.get("/galleries")
+
+        Gallery.objects.create(name = "여행", image = "def.jpg")
+        response = client.get("/galleries")
+
+        self.assertEqual([gallery["gallery_name"] for gallery in response.json()["MESSAGE"]], ["경제", "여행"])
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL = 60)
+class ConditionalGetTest(TestCase) :
+    def setUp(self) :
+        cache.clear()
+        view_counter.pending.clear()
+        view_counter.flush()
+
+        self.gallery = Gallery.objects.create(name = "test", image = "image.jpg")
+        self.user    = User.objects.create(nickname = "testuser1")
+        self.posting = Posting.objects.create(gallery = self.gallery, title = "testpost1", content = "testtext1", user = self.user)
+        Viewcount.objects.create(posting = self.posting)
+        Comment.objects.create(content = "comment", user = self.user, posting = self.posting)
+
+    def revalidate(self, url) :
+        client   = Client()
+        response = client.get(url)
+        return response, client.get(url, HTTP_IF_NONE_MATCH = response["ETag"])
+
+    def test_gallery_list_not_modified(self) :
+        response, revalidated = self.revalidate("/galleries")
+
+        self.assertEqual(revalidated.status_code, 304)
+        Gallery.objects.create(name = "여행", image = "def.jpg")
+        self.assertEqual(Client().get("/galleries", HTTP_IF_NONE_MATCH = response["ETag"]).status_code, 200)
+
+    def test_posting_list_not_modified(self) :
+        url                   = f"/galleries/{self.gallery.id}"
+        response, revalidated = self.revalidate(url)
+
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b"")
+
+        Comment.objects.create(content = "another", user = self.user, posting = self.posting)
+        self.assertEqual(Client().get(url, HTTP_IF_NONE_MATCH = response["ETag"]).status_code, 200)
+
+    def test_posting_list_etag_follows_flushed_views_and_renames(self) :
+        url  = f"/galleries/{self.gallery.id}"
+        etag = Client().get(url)["ETag"]
+
+        Client().get(f"{url}/{self.posting.id}")
+        self.assertEqual(Client().get(url, HTTP_IF_NONE_MATCH = etag).status_code, 304)
+
+        view_counter.flush()
+        response = Client().get(url, HTTP_IF_NONE_MATCH = etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertEqual(Client().get(url, HTTP_IF_NONE_MATCH = etag).status_code, 304)
+
+        self.user.nickname = "renamed"
+        self.user.save()
+        self.assertEqual(Client().get(url, HTTP_IF_NONE_MATCH = etag).status_code, 200)
+
+    def test_etags_need_no_queries(self) :
+        url  = f"/galleries/{self.gallery.id}/{self.posting.id}/comments"
+        etag = Client().get(url)["ETag"]
+
+        with self.assertNumQueries(0) :
+            self.assertEqual(Client().get(url, HTTP_IF_NONE_MATCH = etag).status_code, 304)
+
+    def test_posting_list_etag_follows_query(self) :
+        url = f"/galleries/{self.gallery.id}"
+        self.assertNotEqual(Client().get(url)["ETag"], Client().get(url + "?page=2")["ETag"])
+
+    def test_posting_not_modified_still_counts_view(self) :
+        url                   = f"/galleries/{self.gallery.id}/{self.posting.id}"
+        response, revalidated = self.revalidate(url)
+
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(view_counter.get(self.posting.id, 0), 2)
+
+    def test_comment_list_changes_after_patch(self) :
+        url      = f"/galleries/{self.gallery.id}/{self.posting.id}/comments"
+        response = Client().get(url)
+        comment  = Comment.objects.get(content = "comment")
+        header   = {"HTTP_Authorization" : jwt.encode({"id" : self.user.id}, SECRET_KEY, algorithm = ALGORITHMS)}
+
+        Client().patch(f"{url}/{comment.id}", json.dumps({"content" : "edited"}), content_type = "application/json", **header)
+        revalidated = Client().get(url, HTTP_IF_NONE_MATCH = response["ETag"])
+
+        self.assertEqual(revalidated.status_code, 200)
+        self.assertEqual(revalidated.json()["MESSAGE"][0]["content"], "edited")
+
+    def test_cache_outage_serves_fresh_content_without_etags(self) :
+        etag     = Client().get("/galleries")["ETag"]
+        outage   = MagicMock(**{"get.return_value" : None, "add.return_value" : False})
+        comments = f"/galleries/{self.gallery.id}/{self.posting.id}/comments"
+
+        with patch("core.utils.cache", outage) :
+            Gallery.objects.create(name = "여행", image = "def.jpg")
+            for url in ("/galleries", "/galleries", f"/galleries/{self.gallery.id}", comments) :
+                response = Client().get(url, HTTP_IF_NONE_MATCH = etag)
+                self.assertEqual(response.status_code, 200, url)
+                self.assertFalse(response.has_header("ETag"), url)
+
+            names = [gallery["gallery_name"] for gallery in Client().get("/galleries").json()["MESSAGE"]]
+        self.assertEqual(names, ["test", "여행"])
+
+class QueryPlanTest(TestCase) :
+    def setUp(self) :
+        cache.clear()
+        self.user    = User.objects.create(nickname = "testuser1")
+        self.gallery = Gallery.objects.create(name = "test", image = "image.jpg")
+        self.posting = Posting.objects.create(gallery = self.gallery, title = "testpost1", content = "testtext1", user = self.user)
+        Viewcount.objects.create(posting = self.posting)
+        Comment.objects.create(content = "comment", user = self.user, posting = self.posting)
+        Bookmark.objects.create(user = self.user, gallery = self.gallery)
+        Like.objects.create(user = self.user, posting = self.posting)
+
+        self.header = {"HTTP_Authorization" : jwt.encode({"id" : self.user.id}, SECRET_KEY, algorithm = ALGORITHMS)}
+
+    def assertNoFullScans(self, url, allowed = ()) :
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries :
+            response = Client().get(url, **self.header)
+
+        self.assertEqual(response.status_code, 200)
+        for query in queries.captured_queries :
+            scans = [table for table in full_table_scans(query["sql"]) if table not in allowed]
+            self.assertEqual(scans, [], query["sql"])
+
+    def test_gallery_read_paths(self) :
+        base = f"/galleries/{self.gallery.id}"
+
+        self.assertNoFullScans("/galleries", allowed = ("galleries",))
+        self.assertNoFullScans(base)
+        self.assertNoFullScans(base + "?cursor=")
+        self.assertNoFullScans(f"{base}/{self.posting.id}")
+        self.assertNoFullScans(f"{base}/{self.posting.id}/comments")
+        self.assertNoFullScans(f"{base}/{self.posting.id}/comments?cursor=")
+        self.assertNoFullScans("/galleries/bookmark-list")
+
+    def test_toggle_lookups(self) :
+        lookups = [
+            Like.objects.filter(posting_id = self.posting.id, user_id = self.user.id),
+            Bookmark.objects.filter(gallery_id = self.gallery.id, user_id = self.user.id),
+        ]
+
+        for queryset in lookups :
+            sql, params = queryset.query.sql_with_params()
+            self.assertEqual(full_table_scans(sql, params), [], sql)
@@ -1,11 +1,16 @@
 from django.urls import path
 
-from galleries.views import BookmarkView, PostingsView, PostingView, CommentsView, CommentView, GalleriesView, ImageView, PostingLikeView
+from galleries.views import (
+    BookmarkView, BookmarkBatchView, PostingsView, PostingView, CommentsView, CommentView, GalleriesView, ImageView,
+    PostingLikeView, PostingLikeBatchView
+)
 
 urlpatterns = [
     path("", GalleriesView.as_view()),
     path("/<int:gallery_id>/bookmark", BookmarkView.as_view()),
     path("/bookmark-list", BookmarkView.as_view()),
+    path("/bookmarks", BookmarkBatchView.as_view()),
+    path("/likes", PostingLikeBatchView.as_view()),
     path("/<int:gallery_id>", PostingsView.as_view()),
     path("/<int:gallery_id>/<int:posting_id>", PostingView.as_view()),
     path("/<int:gallery_id>/<int:posting_id>/like", PostingLikeView.as_view()),
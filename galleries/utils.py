@@ -0,0 +1,248 @@
+import atexit
+import json
+import logging
+import threading
+import time
+
+from collections                import defaultdict
+from django.conf                import settings
+from django.core.cache          import cache
+from django.db                  import DatabaseError, connections, router, transaction
+from django.db.models           import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from core.db.routers  import primary_reads
+from core.http        import get_json_dumps
+from core.images      import derivative_url, thumbnail_url
+from core.utils       import cache_version, stored_version, bump_cache_version, make_etag
+from galleries.models import Gallery, Posting, Comment, Like, Viewcount
+from my_settings      import AWS_LOGGER_NAME
+
+logger = logging.getLogger(AWS_LOGGER_NAME)
+
+class ViewCountBuffer:
+    def __init__(self):
+        self.lock       = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.pending    = {}
+        self.flushing   = {}
+        self.last_flush = time.monotonic()
+
+    def increment(self, posting_id):
+        with self.lock:
+            self.pending[posting_id] = self.pending.get(posting_id, 0) + 1
+
+    def flush_if_due(self):
+        with self.lock:
+            is_due = self.pending and (time.monotonic() - self.last_flush >= settings.VIEW_COUNT_FLUSH_INTERVAL
+                or len(self.pending) >= settings.VIEW_COUNT_MAX_PENDING)
+
+        if is_due:
+            try:
+                self.flush()
+            except DatabaseError:
+                logger.exception("view count flush failed; counts stay buffered for the next attempt")
+
+    def get(self, posting_id, persisted):
+        with self.lock:
+            return persisted + self.pending.get(posting_id, 0) + self.flushing.get(posting_id, 0)
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                if not self.pending:
+                    self.last_flush = time.monotonic()
+                    return
+                self.flushing, self.pending = self.pending, {}
+                self.last_flush             = time.monotonic()
+
+            postings_by_delta = defaultdict(list)
+            for posting_id, delta in self.flushing.items():
+                postings_by_delta[delta].append(posting_id)
+
+            try:
+                with transaction.atomic():
+                    for delta, posting_ids in postings_by_delta.items():
+                        Viewcount.objects.filter(posting_id__in=posting_ids).update(view_count=F("view_count") + delta)
+                        Posting.objects.filter(id__in=posting_ids).update(view_count=F("view_count") + delta)
+
+                    primary     = router.db_for_write(Posting)
+                    gallery_ids = list(Posting.objects.using(primary).filter(id__in=self.flushing).values_list("gallery_id", flat=True).distinct())
+
+            except DatabaseError:
+                with self.lock:
+                    for posting_id, delta in self.flushing.items():
+                        self.pending[posting_id] = self.pending.get(posting_id, 0) + delta
+                raise
+
+            finally:
+                with self.lock:
+                    self.flushing = {}
+
+            try:
+                bump_versions("postings-version", gallery_ids)
+            except Exception:
+                logger.exception("postings-version bump failed after flushing view counts")
+
+view_counter = ViewCountBuffer()
+
+def posting_counters():
+    def total(model, aggregate):
+        rows = model.objects.filter(posting=OuterRef("pk")).order_by().values("posting")
+        return Coalesce(Subquery(rows.annotate(total=aggregate).values("total")), 0)
+
+    return {
+        "comment_count" : total(Comment, Count("id")),
+        "like_count"    : total(Like, Count("id")),
+        "view_count"    : total(Viewcount, Sum("view_count")),
+    }
+
+class GalleryCatalogue:
+    version_key = "gallery-catalogue-version"
+
+    def __init__(self):
+        self.lock    = threading.Lock()
+        self.version = object()
+        self.content = None
+
+    def get(self):
+        version = cache_version(self.version_key, settings.GALLERY_CATALOGUE_TIMEOUT)
+
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    with primary_reads():
+                        gallery_list = [{
+                            "gallery_id"    : gallery.id,
+                            "gallery_name"  : gallery.name,
+                            "gallery_image" : gallery.image
+                        } for gallery in Gallery.objects.all()]
+
+                    self.content = get_json_dumps()({"MESSAGE" : gallery_list})
+                    self.version = version
+
+        return self.content
+
+    def etag(self):
+        return stored_version(self.version_key, settings.GALLERY_CATALOGUE_TIMEOUT)
+
+    def invalidate(self):
+        bump_cache_version(self.version_key, settings.GALLERY_CATALOGUE_TIMEOUT)
+
+gallery_catalogue = GalleryCatalogue()
+
+def galleries_etag(request):
+    return gallery_catalogue.etag()
+
+def bump_versions(prefix, ids):
+    for key in set(ids):
+        bump_cache_version(f"{prefix}:{key}")
+
+def thumbnail_waiters_key(url):
+    return f"thumbnail-waiters:{make_etag(url)}"
+
+def wait_for_thumbnail(posting):
+    if derivative_url(posting.thumbnail) == posting.thumbnail:
+        return
+
+    key = thumbnail_waiters_key(posting.thumbnail)
+    cache.set(key, cache.get(key, []) + [posting.id], settings.IMAGE_DERIVATIVE_READY_TIMEOUT)
+    if thumbnail_url(posting.thumbnail) != posting.thumbnail:
+        attach_thumbnail(posting.thumbnail)
+
+def attach_thumbnail(url):
+    key         = thumbnail_waiters_key(url)
+    posting_ids = cache.get(key)
+    if not posting_ids:
+        return
+
+    postings = Posting.objects.filter(id__in=posting_ids, thumbnail=url)
+    with primary_reads():
+        gallery_ids = list(postings.values_list("gallery_id", flat=True))
+    if postings.update(thumbnail=derivative_url(url)):
+        bump_versions("postings-version", gallery_ids)
+    cache.delete(key)
+
+def postings_etag(request, gallery_id):
+    version = stored_version(f"postings-version:{gallery_id}")
+    return version and 'W/"%s"' % make_etag(gallery_id, request.GET.urlencode(), version)
+
+def posting_etag(posting, prev_id, next_id):
+    return 'W/"%s"' % make_etag(posting.id, posting.updated_at, posting.comment_count, posting.user.updated_at, prev_id, next_id)
+
+def comments_etag(request, posting_id, gallery_id):
+    version = stored_version(f"comments-version:{posting_id}")
+    return version and make_etag(posting_id, request.GET.urlencode(), version)
+
+def bookmarks_etag(request):
+    catalogue, version = gallery_catalogue.etag(), stored_version(f"bookmarks-version:{request.user.id}")
+    return catalogue and version and make_etag(request.user.id, catalogue, version)
+
+def gallery_bounds(gallery_id):
+    key    = f"gallery-bounds:{gallery_id}"
+    bounds = cache.get(key)
+
+    if bounds is None:
+        postings = Posting.objects.filter(gallery_id=gallery_id).values_list("id", flat=True)
+        with primary_reads():
+            bounds = (
+                postings.order_by("created_at", "id").first(),
+                postings.order_by("-created_at", "-id").first(),
+            )
+        cache.set(key, bounds, settings.GALLERY_BOUNDS_TIMEOUT)
+
+    return bounds
+
+def clear_gallery_bounds(gallery_id):
+    cache.delete(f"gallery-bounds:{gallery_id}")
+
+def posting_neighbours(posting):
+    first_id, last_id = gallery_bounds(posting.gallery_id)
+    postings          = Posting.objects.filter(gallery_id=posting.gallery_id).values_list("id", flat=True)
+
+    prev_id = None if posting.id == first_id else postings.filter(
+        Q(created_at__lt=posting.created_at) | Q(created_at=posting.created_at, id__lt=posting.id)
+    ).order_by("-created_at", "-id").first()
+
+    next_id = None if posting.id == last_id else postings.filter(
+        Q(created_at__gt=posting.created_at) | Q(created_at=posting.created_at, id__gt=posting.id)
+    ).order_by("created_at", "id").first()
+
+    return prev_id, next_id
+
+def parse_toggle_states(body):
+    payload = json.loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError("Body must be a JSON object")
+
+    states = payload["states"]
+    if not isinstance(states, dict) or any(not isinstance(state, bool) for state in states.values()):
+        raise ValueError("States must map ids to true or false")
+    return {int(target_id) : state for target_id, state in states.items()}
+
+def apply_toggles(model, target, user_id, states):
+    selected   = [target_id for target_id, state in states.items() if state]
+    unselected = [target_id for target_id, state in states.items() if not state]
+
+    model.objects.bulk_create([model(user_id=user_id, **{f"{target}_id" : target_id}) for target_id in selected], ignore_conflicts=True)
+    if unselected:
+        delete_rows(model, target, user_id, unselected)
+
+def delete_rows(model, target, user_id, target_ids):
+    connection = connections[router.db_for_write(model)]
+    quote      = connection.ops.quote_name
+    table      = quote(model._meta.db_table)
+    user       = quote(model._meta.get_field("user").column)
+    column     = quote(model._meta.get_field(target).column)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE {user} = %s AND {column} IN ({', '.join(['%s'] * len(target_ids))})", [user_id, *target_ids]
+        )
+
+@atexit.register
+def flush_view_counter():
+    try:
+        view_counter.flush()
+    except DatabaseError:
+        logger.exception("view count flush failed at shutdown; buffered counts are lost")
@@ -1,25 +1,33 @@
 import json
 import re
 
-from django.core.paginator import Paginator
-from django.views          import View
-from django.http           import JsonResponse
-from core.utils            import CloudStorage
+from django.conf                  import settings
+from django.core.paginator        import Paginator
+from django.db                    import transaction
+from django.views                 import View
+from django.http                  import HttpResponse
+from django.utils                 import timezone
+from django.utils.cache           import get_conditional_response
+from django.utils.decorators      import method_decorator
+from django.views.decorators.http import condition
+from core.http                    import JsonResponse
+from core.images                  import queue_derivatives, thumbnail_url
+from core.uploadhandlers          import S3UploadHandler
+from core.utils                   import CursorPaginator, InvalidCursor
 
 from galleries.models   import Gallery, Bookmark, Posting, Comment, Viewcount, Like
+from galleries.utils    import (
+    view_counter, posting_neighbours, gallery_catalogue, posting_counters, parse_toggle_states, apply_toggles, bump_versions,
+    wait_for_thumbnail, galleries_etag, postings_etag, posting_etag, comments_etag, bookmarks_etag
+)
+from users.profile      import invalidate_profile
 from users.utils        import login_decorator
-from my_settings        import AWS_IAM_ACCESS_KEY_ID, AWS_S3_STORAGE_BUCKET_NAME, AWS_IAM_SECRET_ACCESS_KEY, AWS_S3_BUCKET_URL
+from my_settings        import AWS_S3_BUCKET_URL
 
 class GalleriesView(View):
+    @method_decorator(condition(etag_func=galleries_etag))
     def get(self, request):
-        galleries    = Gallery.objects.all()
-        gallery_list = [{
-            "gallery_id"    : gallery.id,
-            "gallery_name"  : gallery.name,
-            "gallery_image" : gallery.image
-        } for gallery in galleries]
-        
-        return JsonResponse({"MESSAGE" : gallery_list}, status=200)
+        return HttpResponse(gallery_catalogue.get(), content_type="application/json", status=200)
 
 class BookmarkView(View):
     @login_decorator
@@ -28,8 +36,8 @@ class BookmarkView(View):
             return JsonResponse({"MESSAGE" : "GALLERY_DOES_NOT_EXIST"}, status=400)
 
         bookmark, is_bookmark = Bookmark.objects.get_or_create(
-            gallery = Gallery.objects.get(id=gallery_id),
-            user    = request.user
+            gallery_id = gallery_id,
+            user_id    = request.user.id
         )
 
         if not is_bookmark:
@@ -39,6 +47,7 @@ class BookmarkView(View):
         return JsonResponse({"MESSAGE" : "BOOKMARK_CREATED"}, status=201)
 
     @login_decorator
+    @method_decorator(condition(etag_func=bookmarks_etag))
     def get(self, request):
         bookmarks = Bookmark.objects.select_related("gallery").filter(user_id=request.user.id)
 
@@ -49,31 +58,65 @@ class BookmarkView(View):
 
         return JsonResponse({"MESSAGE" : gallery_list}, status=200)
 
+class BookmarkBatchView(View):
+    @login_decorator
+    def post(self, request):
+        try:
+            states = parse_toggle_states(request.body)
+        except KeyError:
+            return JsonResponse({"MESSAGE" : "KEY_ERROR"}, status=400)
+        except ValueError:
+            return JsonResponse({"MESSAGE" : "INVALID_STATES"}, status=400)
+
+        if len(states) > settings.BATCH_TOGGLE_MAX_ITEMS:
+            return JsonResponse({"MESSAGE" : "TOO_MANY_ITEMS"}, status=400)
+
+        with transaction.atomic():
+            if Gallery.objects.filter(id__in=states).count() != len(states):
+                return JsonResponse({"MESSAGE" : "GALLERY_DOES_NOT_EXIST"}, status=400)
+
+            apply_toggles(Bookmark, "gallery", request.user.id, states)
+            bump_versions("bookmarks-version", [request.user.id])
+
+        invalidate_profile(request.user.id)
+        return JsonResponse({"MESSAGE" : states}, status=200)
+
 class PostingsView(View):
+    @method_decorator(condition(etag_func=postings_etag))
     def get(self, request, gallery_id):
-        if not Gallery.objects.filter(id=gallery_id).exists():
+        postingslist = Posting.objects.filter(gallery=gallery_id).select_related("user").only(
+            "id", "title", "thumbnail", "view_count", "comment_count", "created_at", "updated_at", "user__nickname"
+        ).order_by("created_at")
+
+        if "cursor" in request.GET:
+            try:
+                postings, next_cursor = CursorPaginator(postingslist, 10).get_page(request.GET["cursor"])
+            except InvalidCursor:
+                return JsonResponse({"MESSAGE" : "INVALID_CURSOR"}, status = 400)
+        else:
+            pagenator = Paginator(postingslist, 10)
+            page      = request.GET.get("page", 1)
+            postings  = pagenator.get_page(page)
+            is_next   = postings.has_next()
+
+        if not postings and not Gallery.objects.filter(id=gallery_id).exists():
             return JsonResponse({"MESSAGE": "KEY_ERROR"}, status = 400)
 
-        postingslist = Posting.objects.filter(gallery=gallery_id).select_related("user")\
-            .prefetch_related("comment_set", "viewcount_set").order_by("created_at")
-
-        pagenator = Paginator(postingslist, 10)
-        page      = request.GET.get("page", 1)
-        postings  = pagenator.get_page(page)
-        is_next   = postings.has_next()
-
         response = [{
             "id"            : posting.id,
             "title"         : posting.title,
             "thumbnail"     : posting.thumbnail,
-            "view_count"    : posting.viewcount_set.get(posting_id=posting.id).view_count,
+            "view_count"    : view_counter.get(posting.id, posting.view_count),
             "created_at"    : posting.created_at,
             "updated_at"    : posting.updated_at,
-            "comment_count" : posting.comment_set.count(),
+            "comment_count" : posting.comment_count,
             "user_nickname" : posting.user.nickname,
-            "user_id"       : posting.user.id,
+            "user_id"       : posting.user_id,
         } for posting in postings]
 
+        if "cursor" in request.GET:
+            return JsonResponse({"MESSAGE" : response, "IS_NEXT" : next_cursor is not None, "NEXT_CURSOR" : next_cursor}, status=200)
+
         return JsonResponse({"MESSAGE" : response, "IS_NEXT" : is_next}, status=200)
 
     @login_decorator
@@ -90,9 +133,11 @@ class PostingsView(View):
                 gallery_id = gallery_id,
                 title      = title if title else None,
                 content    = content if content else None,
-                user       = request.user,
-                thumbnail  = imagelist[0] if imagelist else "example.jpg"
+                user_id    = request.user.id,
+                thumbnail  = thumbnail_url(imagelist[0]) if imagelist else "example.jpg"
             )
+            if imagelist and posting.thumbnail == imagelist[0]:
+                wait_for_thumbnail(posting)
             
             Viewcount.objects.create(
                 posting = posting
@@ -105,40 +150,47 @@ class PostingsView(View):
 
 class PostingView(View):
     def get(self, request, posting_id, gallery_id):
-        if not Posting.objects.filter(id = posting_id, gallery_id = gallery_id).exists():
+        try:
+            posting = Posting.objects.select_related("user").get(id = posting_id, gallery_id = gallery_id)
+        except Posting.DoesNotExist:
             return JsonResponse({"MESSAGE": "KEY_ERROR"}, status = 400)
 
-        posting       = Posting.objects.select_related("user").prefetch_related("comment_set").get(id = posting_id)
-        first_posting = Posting.objects.filter(gallery_id = gallery_id).order_by('created_at').first()
-        last_posting  = Posting.objects.filter(gallery_id = gallery_id).order_by('created_at').last()
-        
-        vc            = posting.viewcount_set.get(posting_id = posting.id)
-        vc.view_count = vc.view_count + 1
-        vc.save()
-        
+        prev_id, next_id = posting_neighbours(posting)
+        view_counter.increment(posting.id)
+
+        etag     = posting_etag(posting, prev_id, next_id)
+        response = get_conditional_response(request, etag = etag)
+        if response is not None:
+            return response
+
         response = {
             "id"            : posting.id,
             "title"         : posting.title,
             "thumbnail"     : posting.thumbnail,
             "content"       : posting.content,
-            "view_count"    : vc.view_count,
+            "view_count"    : view_counter.get(posting.id, posting.view_count),
             "created_at"    : posting.created_at,
             "updated_at"    : posting.updated_at,
-            "comment_count" : posting.comment_set.count(),
+            "comment_count" : posting.comment_count,
             "user_name"     : posting.user.nickname,
             "user_id"       : posting.user.id,
-            "first"         : True if posting_id == first_posting.id else False,
-            "last"          : True if posting_id == last_posting.id else False
+            "prev_id"       : prev_id,
+            "next_id"       : next_id,
+            "first"         : prev_id is None,
+            "last"          : next_id is None
         }
 
-        return JsonResponse({"MESSAGE" : response}, status = 200)
+        response         = JsonResponse({"MESSAGE" : response}, status = 200)
+        response["ETag"] = etag
+        return response
 
     @login_decorator
     def post(self, request, posting_id, gallery_id) :
         if not Posting.objects.filter(id = posting_id).exists() :
             return JsonResponse({"MESSAGE" : "NO_POSTING"}, status = 404)
         
-        if Posting.objects.get(id = posting_id).user != request.user :
+        posting = Posting.objects.get(id = posting_id)
+        if posting.user_id != request.user.id :
             return JsonResponse({"MESSAGE" : "NO_PERMISSION"}, status = 403)
 
         try :
@@ -146,12 +198,11 @@ class PostingView(View):
             content   = request.POST.get("content")
             
             imagelist = re.findall('!\[\]\((.+?)\)', content)
-            
-            Posting.objects.filter(id = posting_id).update(
-                title     = title if title else None,
-                content   = content if content else None,
-                thumbnail = imagelist[0] if imagelist else "example.jpg"
-            )
+
+            posting.title     = title if title else None
+            posting.content   = content if content else None
+            posting.thumbnail = thumbnail_url(imagelist[0]) if imagelist else "example.jpg"
+            posting.save(update_fields = ["title", "content", "thumbnail", "updated_at"])
             
             return JsonResponse({"MESSAGE" : "SUCCESS"}, status = 201)
 
@@ -163,7 +214,7 @@ class PostingView(View):
         if not Posting.objects.filter(id = posting_id).exists() :
             return JsonResponse({"MESSAGE" : "NO_POSTING"}, status = 404)
         
-        if Posting.objects.get(id = posting_id).user != request.user :
+        if Posting.objects.get(id = posting_id).user_id != request.user.id :
             return JsonResponse({"MESSAGE" : "NO_PERMISSION"}, status = 403)
 
         try :
@@ -177,10 +228,13 @@ class PostingLikeView(View):
     @login_decorator
     def post(self, request, posting_id, gallery_id):
         try:
-            like, flag = Like.objects.get_or_create(posting_id = posting_id, user_id = request.user.id)
-            
+            with transaction.atomic():
+                like, flag = Like.objects.get_or_create(posting_id = posting_id, user_id = request.user.id)
+
+                if not flag:
+                    like.delete()
+
             if not flag:
-                like.delete()
                 return JsonResponse({"MESSAGE" : "UNLIKED"}, status = 204)
             else:
                 return JsonResponse({"MESSAGE" : "LIKED"}, status = 201)
@@ -188,14 +242,44 @@ class PostingLikeView(View):
         except KeyError:
             return JsonResponse({"MESSAGE" : "KEY_ERROR"}, status = 400)
 
+class PostingLikeBatchView(View):
+    @login_decorator
+    def post(self, request):
+        try:
+            states = parse_toggle_states(request.body)
+        except KeyError:
+            return JsonResponse({"MESSAGE" : "KEY_ERROR"}, status = 400)
+        except ValueError:
+            return JsonResponse({"MESSAGE" : "INVALID_STATES"}, status = 400)
+
+        if len(states) > settings.BATCH_TOGGLE_MAX_ITEMS:
+            return JsonResponse({"MESSAGE" : "TOO_MANY_ITEMS"}, status = 400)
+
+        with transaction.atomic():
+            if Posting.objects.filter(id__in = states).count() != len(states):
+                return JsonResponse({"MESSAGE" : "POSTING_DOES_NOT_EXIST"}, status = 400)
+
+            apply_toggles(Like, "posting", request.user.id, states)
+            Posting.objects.filter(id__in = states).update(like_count = posting_counters()["like_count"])
+
+        invalidate_profile(request.user.id)
+        return JsonResponse({"MESSAGE" : states}, status = 200)
+
 class CommentsView(View):
+    @method_decorator(condition(etag_func=comments_etag))
     def get(self, request, posting_id, gallery_id):
         commentslist = Comment.objects.filter(posting = posting_id).select_related("user").order_by("created_at")
 
-        pagenator  = Paginator(commentslist, 10)
-        page       = request.GET.get("page", 1)
-        comments   = pagenator.get_page(page)
-        num_pages  = pagenator.num_pages
+        if "cursor" in request.GET:
+            try:
+                comments, next_cursor = CursorPaginator(commentslist, 10).get_page(request.GET["cursor"])
+            except InvalidCursor:
+                return JsonResponse({"MESSAGE" : "INVALID_CURSOR"}, status = 400)
+        else:
+            pagenator  = Paginator(commentslist, 10)
+            page       = request.GET.get("page", 1)
+            comments   = pagenator.get_page(page)
+            num_pages  = pagenator.num_pages
 
         response = [{
             "id"            : comment.id,
@@ -206,6 +290,9 @@ class CommentsView(View):
             "user_id"       : comment.user.id
         } for comment in comments]
 
+        if "cursor" in request.GET:
+            return JsonResponse({"MESSAGE" : response, "IS_NEXT" : next_cursor is not None, "NEXT_CURSOR" : next_cursor}, status = 200)
+
         return JsonResponse({"MESSAGE" : response, "PAGE_RANGE" : num_pages}, status = 200)
 
     @login_decorator
@@ -215,11 +302,12 @@ class CommentsView(View):
                 return JsonResponse({"MESSAGE" : "NO_POSTING"}, status = 404)
 
             data = json.loads(request.body)
-            Comment.objects.create(
-                content    = data.get("content"),
-                user       = request.user,
-                posting_id = posting_id
-            )
+            with transaction.atomic():
+                Comment.objects.create(
+                    content    = data.get("content"),
+                    user_id    = request.user.id,
+                    posting_id = posting_id
+                )
 
             return JsonResponse({"MESSAGE" : "SUCCESS"}, status = 201)
 
@@ -232,12 +320,13 @@ class CommentView(View):
         if not Comment.objects.filter(id = comment_id).exists() :
             return JsonResponse({"MESSAGE" : "NO_COMMENT"}, status = 404)
     
-        if Comment.objects.get(id = comment_id).user != request.user :
+        if Comment.objects.get(id = comment_id).user_id != request.user.id :
             return JsonResponse({"MESSAGE" : "NO_PERMISSION"}, status = 403)
         
         try :
             data = json.loads(request.body)
-            Comment.objects.filter(id=comment_id).update(content = data.get("content"))
+            Comment.objects.filter(id=comment_id).update(content = data.get("content"), updated_at = timezone.now())
+            bump_versions("comments-version", [posting_id])
             return JsonResponse({"MESSAGE" : "SUCCESS"}, status = 201)
 
         except KeyError :
@@ -248,7 +337,7 @@ class CommentView(View):
         if not Comment.objects.filter(id = comment_id).exists() :
             return JsonResponse({"MESSAGE" : "NO_COMMENT"}, status = 404)
         
-        if Comment.objects.get(id = comment_id).user != request.user:
+        if Comment.objects.get(id = comment_id).user_id != request.user.id:
             return JsonResponse({"MESSAGE" : "NO_PERMISSION"}, status = 403)
 
         try :
@@ -262,11 +351,16 @@ class ImageView(View):
     @login_decorator
     def post(self, request) :
         try :
-            image         = request.FILES.get("image")
-            cloud_storage = CloudStorage(id = AWS_IAM_ACCESS_KEY_ID, password = AWS_IAM_SECRET_ACCESS_KEY,
-                                         bucket = AWS_S3_STORAGE_BUCKET_NAME)
-            upload_key    = cloud_storage.upload_file(image)
-            image         = AWS_S3_BUCKET_URL + upload_key
+            upload_handler          = S3UploadHandler(request)
+            request.upload_handlers = [upload_handler]
+
+            image = request.FILES.get("image")
+            if upload_handler.error:
+                return JsonResponse({"MESSAGE" : upload_handler.error}, status = 400)
+
+            queue_derivatives(image.key)
+
+            image = AWS_S3_BUCKET_URL + image.key
             return JsonResponse({"MESSAGE" : image}, status = 201)
             
         except KeyError:
@@ -0,0 +1,17 @@
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+def on_starting(server):
+    if server.cfg.workers > 1 and not os.environ.get("MEMCACHED_LOCATION"):
+        raise RuntimeError("Set MEMCACHED_LOCATION to run more than one worker; cache invalidations are not shared otherwise")
+
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seso.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+# Django's ASGIHandler buffers the whole body before any view runs, so oversized bodies are refused here
+from core.asgi import BoundedASGIHandler
+
+application = BoundedASGIHandler()
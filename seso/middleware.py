@@ -1,7 +1,245 @@
-from django.http import HttpResponse
-from django.utils.deprecation import MiddlewareMixin
+import asyncio
+import logging
+import random
+import time
 
-class HealthCheckMiddleware(MiddlewareMixin):
-    def process_request(self, request):
+from asgiref.sync        import sync_to_async
+from django.conf         import settings
+from django.core.signing import BadSignature, TimestampSigner
+from django.db           import DEFAULT_DB_ALIAS
+from django.http         import HttpResponse
+
+from core.db.routers import read_database
+from core.signals    import active_recorder
+from core.metrics    import DB_DURATION, DB_QUERIES, REQUESTS, REQUEST_DURATION, render, route_label
+
+sql_logger     = logging.getLogger("seso.sql")
+request_logger = logging.getLogger("seso.request")
+
+TEXT_CONTENT_TYPES = ("application/json", "application/x-www-form-urlencoded", "text/")
+SAFE_METHODS       = ("GET", "HEAD", "OPTIONS")
+REPLICA_PIN_HEADER = "X-Primary-Pin"
+
+class AsyncCapableMiddleware:
+    sync_capable  = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async     = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+class HealthCheckMiddleware(AsyncCapableMiddleware):
+    def __call__(self, request):
         if request.META["PATH_INFO"] == "/ping":
-            return HttpResponse("pong")
\ No newline at end of file
+            return self.pong() if self.is_async else HttpResponse("pong")
+        return self.get_response(request)
+
+    async def pong(self):
+        return HttpResponse("pong")
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        if request.META["PATH_INFO"] == "/metrics" and self.allowed(request):
+            return self.metrics()
+
+        start = time.perf_counter()
+        return self.record(request, self.get_response(request), start)
+
+    async def __acall__(self, request):
+        if request.META["PATH_INFO"] == "/metrics" and self.allowed(request):
+            return await sync_to_async(self.metrics, thread_sensitive=False)()
+
+        start = time.perf_counter()
+        return self.record(request, await self.get_response(request), start)
+
+    def allowed(self, request):
+        return settings.METRICS_ENABLED or request.META.get("REMOTE_ADDR") in settings.INTERNAL_IPS
+
+    def metrics(self):
+        content, content_type = render()
+        return HttpResponse(content, content_type=content_type)
+
+    def record(self, request, response, start):
+        route = route_label(request)
+        REQUEST_DURATION.labels(request.method, route).observe(time.perf_counter() - start)
+        REQUESTS.labels(request.method, route, response.status_code).inc()
+        return response
+
+class QueryRecorder:
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.count     = 0
+        self.duration  = 0.0
+        self.slow      = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed        = (time.perf_counter() - start) * 1000
+            self.count    += 1
+            self.duration += elapsed
+            if elapsed >= self.threshold:
+                self.slow.append((context["connection"].alias, sql, elapsed))
+
+class QueryInstrumentationMiddleware(AsyncCapableMiddleware):
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        recorder = QueryRecorder(settings.SQL_SLOW_QUERY_MS)
+        start    = time.perf_counter()
+        token    = active_recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            active_recorder.reset(token)
+        return self.report(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder(settings.SQL_SLOW_QUERY_MS)
+        start    = time.perf_counter()
+        token    = active_recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            active_recorder.reset(token)
+        return self.report(request, response, recorder, start)
+
+    def report(self, request, response, recorder, start):
+        duration = (time.perf_counter() - start) * 1000
+        route    = route_label(request)
+        DB_QUERIES.labels(route).inc(recorder.count)
+        DB_DURATION.labels(route).observe(recorder.duration / 1000)
+
+        if settings.SERVER_TIMING_ENABLED or request.META.get("REMOTE_ADDR") in settings.INTERNAL_IPS:
+            timing = f'db;dur={recorder.duration:.1f};desc="{recorder.count} queries", app;dur={duration:.1f}'
+            response["Server-Timing"] = f'{response["Server-Timing"]}, {timing}' if response.has_header("Server-Timing") else timing
+
+        fields = {
+            "method"      : request.method,
+            "path"        : request.path,
+            "status"      : response.status_code,
+            "db_queries"  : recorder.count,
+            "db_time_ms"  : round(recorder.duration, 1),
+            "duration_ms" : round(duration, 1),
+        }
+        sql_logger.info(
+            "%(method)s %(path)s %(status)s queries=%(db_queries)s db_ms=%(db_time_ms)s total_ms=%(duration_ms)s", fields, extra=fields
+        )
+        for alias, sql, elapsed in recorder.slow:
+            sql_logger.warning(
+                "slow query %.1f ms on %s during %s %s: %s", elapsed, alias, request.method, request.path, sql,
+                extra=dict(fields, db_alias=alias, sql=sql, sql_time_ms=round(elapsed, 1))
+            )
+        return response
+
+class RequestLoggingMiddleware(AsyncCapableMiddleware):
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        start = time.perf_counter()
+        return self.log(request, self.get_response(request), start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        return self.log(request, await self.get_response(request), start)
+
+    def log(self, request, response, start):
+        duration = (time.perf_counter() - start) * 1000
+
+        route   = route_label(request)
+        is_slow = duration >= settings.REQUEST_LOG_SLOW_MS
+        rates   = settings.REQUEST_LOG_SAMPLE_RATES
+        if response.status_code < 500 and not is_slow and random.random() >= rates.get(route, rates["default"]):
+            return response
+
+        fields = {
+            "method"      : request.method,
+            "path"        : request.path,
+            "route"       : route,
+            "status"      : response.status_code,
+            "duration_ms" : round(duration, 1),
+            "headers"     : self.headers(request),
+            "body"        : self.body(request),
+        }
+        level = logging.WARNING if response.status_code >= 500 or is_slow else logging.INFO
+        request_logger.log(level, "%(method)s %(path)s %(status)s %(duration_ms)s ms body=%(body)s", fields, extra=fields)
+        return response
+
+    def headers(self, request):
+        redacted = {header.lower() for header in settings.REQUEST_LOG_REDACTED_HEADERS}
+        return {name : "[REDACTED]" if name.lower() in redacted else value for name, value in request.headers.items()}
+
+    def body(self, request):
+        content_type = request.content_type or ""
+        size         = int(request.META.get("CONTENT_LENGTH") or 0)
+
+        if not size:
+            return ""
+        if not content_type.startswith(TEXT_CONTENT_TYPES):
+            return f"<{content_type or 'unknown'} {size} bytes>"
+        if not hasattr(request, "_body") and size > settings.REQUEST_LOG_MAX_BODY:
+            return f"<{content_type} {size} bytes>"
+
+        body = request.body[:settings.REQUEST_LOG_MAX_BODY].decode(errors="replace")
+        return body + "..." if size > settings.REQUEST_LOG_MAX_BODY else body
+
+class ReplicaPinMiddleware(AsyncCapableMiddleware):
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.signer = TimestampSigner(salt="seso.middleware.ReplicaPinMiddleware")
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        token = read_database.set(self.read_alias(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            read_database.reset(token)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        token = read_database.set(self.read_alias(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_database.reset(token)
+        return self.pin(request, response)
+
+    def read_alias(self, request):
+        if request.method not in SAFE_METHODS or self.is_pinned(request):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin = self.signer.sign("primary")
+            response.set_cookie(settings.REPLICA_PIN_COOKIE, pin, max_age=settings.REPLICA_PIN_SECONDS, httponly=True)
+            response[REPLICA_PIN_HEADER] = pin
+        return response
+
+    def is_pinned(self, request):
+        pin = request.COOKIES.get(settings.REPLICA_PIN_COOKIE) or request.headers.get(REPLICA_PIN_HEADER)
+        if not pin:
+            return False
+
+        try:
+            self.signer.unsign(pin, max_age=settings.REPLICA_PIN_SECONDS)
+        except BadSignature:
+            return False
+        return True
@@ -10,10 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
+import sys
+import tempfile
+
 from pathlib       import Path
-from boto3.session import Session
 
-from my_settings import SECRET_KEY, DATABASES, AWS_IAM_ACCESS_KEY_ID, AWS_IAM_SECRET_ACCESS_KEY, AWS_REGION_NAME, AWS_LOG_GROUP, AWS_LOG_STREAM, AWS_LOGGER_NAME
+from my_settings import SECRET_KEY, DATABASES, AWS_LOG_GROUP, AWS_LOG_STREAM, AWS_LOGGER_NAME
 
 import pymysql
 
@@ -54,6 +57,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'seso.middleware.HealthCheckMiddleware',
+    'seso.middleware.MetricsMiddleware',
+    'seso.middleware.QueryInstrumentationMiddleware',
+    'seso.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,7 +68,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
-    'request_logging.middleware.LoggingMiddleware'
+    'seso.middleware.RequestLoggingMiddleware',
 ]
 
 ROOT_URLCONF = 'seso.urls'
@@ -91,6 +97,28 @@ WSGI_APPLICATION = 'seso.wsgi.application'
 
 DATABASES = DATABASES
 
+# MySQL databases connect through a bounded per-process pool; CONN_MAX_AGE stays 0 so Django
+# hands the connection back to the pool at the end of every request instead of closing it
+for database in DATABASES.values():
+    if database.get("ENGINE") == "django.db.backends.mysql":
+        database["ENGINE"] = "core.db.backends.mysql"
+
+# Defaults for core.db.backends.mysql, overridable per database with a "POOL" entry (seconds)
+DATABASE_POOL = {
+    "MAX_SIZE"     : 10,
+    "MAX_LIFETIME" : 1800,
+    "MAX_IDLE"     : 300,
+    "TIMEOUT"      : 5,
+    "CHECK_AFTER"  : 1,
+}
+
+# Every DATABASES alias other than default is a read replica; after a successful write the client reads
+# from default for REPLICA_PIN_SECONDS, pinned by a signed cookie or the X-Primary-Pin header
+DATABASE_ROUTERS    = ["core.db.routers.ReplicaRouter"]
+DATABASE_REPLICAS   = [alias for alias in DATABASES if alias != "default"]
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE  = "primary_pin"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -138,6 +166,119 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 #REMOVE_APPEND_SLASH_WARNING
 APPEND_SLASH = False
 
+# Profiles, gallery bounds, OAuth identities and ETag version stamps are invalidated by signals, so every
+# worker must share one cache: memcached at MEMCACHED_LOCATION ("host:port"). Without it the cache is local
+# memory, which is only correct in a single process; gunicorn.conf.py refuses to start more workers then
+MEMCACHED_LOCATION = os.environ.get("MEMCACHED_LOCATION")
+
+if MEMCACHED_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND'  : 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION' : MEMCACHED_LOCATION,
+            'OPTIONS'  : {'no_delay' : True, 'ignore_exc' : True, 'use_pooling' : True, 'max_pool_size' : 10},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND' : 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS' : {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# One boto3 S3 client is shared per worker; endpoint_url may point at a local S3 stand-in
+AWS_S3_ENDPOINT_URL         = None
+AWS_S3_MAX_POOL_CONNECTIONS = 10
+
+# Uploaded objects are stored under unique keys and never rewritten, so browsers and CDNs may keep them forever
+AWS_S3_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Image uploads are streamed to S3 by core.uploadhandlers.S3UploadHandler; under ASGI the whole body is buffered
+# first, so core.asgi.BoundedASGIHandler refuses any request body over UPLOAD_MAX_SIZE before reading it
+UPLOAD_MAX_SIZE              = 10 * 1024 * 1024
+UPLOAD_ALLOWED_CONTENT_TYPES  = ("image/",)
+
+# Uploaded images get WebP derivatives in a per-worker thread pool; None keeps the original size.
+# Uploads beyond the queue size keep their original image, and postings only point at a derivative once it exists
+IMAGE_DERIVATIVE_WORKERS       = 2
+IMAGE_DERIVATIVE_QUEUE_SIZE    = 100
+IMAGE_DERIVATIVE_READY_TIMEOUT = 60 * 60 * 24
+IMAGE_DERIVATIVE_QUALITY       = 80
+IMAGE_DERIVATIVE_SIZES         = {
+    "thumbnail" : (400, 400),
+    "webp"      : None,
+}
+
+# View counts are buffered per worker and flushed as batched updates once a request finishes
+# after the interval has passed or the buffer has filled up
+VIEW_COUNT_FLUSH_INTERVAL = 10
+VIEW_COUNT_MAX_PENDING    = 1000
+
+# Tokens verified by login_decorator are cached per worker as token -> user id; each entry is checked
+# against a shared per-user version in the cache, so saving or deleting a user evicts it on every worker
+USER_CACHE_TIMEOUT = 60
+USER_CACHE_SIZE    = 10000
+
+# Rows per profile section; further rows are fetched with ?section=<name>&cursor=
+PROFILE_PAGE_SIZE     = 20
+PROFILE_CACHE_TIMEOUT = 300
+
+# Seconds a gallery's first/last posting ids stay cached for prev/next navigation
+GALLERY_BOUNDS_TIMEOUT = 60
+
+# Each worker keeps the gallery list as pre-encoded JSON; the version stamp expires after this many seconds
+GALLERY_CATALOGUE_TIMEOUT = 300
+
+# core.http.JsonResponse encoder; "orjson" falls back to the stdlib "json" backend when orjson is not installed
+JSON_RESPONSE_BACKEND = "orjson"
+
+# Kakao/Naver profile lookups use one keep-alive httpx.AsyncClient per provider and event loop;
+# retries only repeat failed connection attempts
+OAUTH_PROVIDERS = {
+    "kakao" : {
+        "profile_url"     : "https://kapi.kakao.com/v2/user/me",
+        "timeout"         : 3,
+        "retries"         : 2,
+        "max_connections" : 100,
+    },
+    "naver" : {
+        "profile_url"     : "https://openapi.naver.com/v1/nid/me",
+        "timeout"         : 3,
+        "retries"         : 2,
+        "max_connections" : 100,
+    },
+}
+
+# Seconds a provider account id stays mapped to its user id
+OAUTH_IDENTITY_CACHE_TIMEOUT = 300
+
+# Most ids galleries.views.BookmarkBatchView and PostingLikeBatchView accept in one request
+BATCH_TOGGLE_MAX_ITEMS = 100
+
+# seso.middleware.QueryInstrumentationMiddleware logs the SQL of any query slower than this
+SQL_SLOW_QUERY_MS = 100
+
+# QueryInstrumentationMiddleware only sends its Server-Timing header to clients in INTERNAL_IPS,
+# or to everyone when SERVER_TIMING_ENABLED is set; the header exposes query counts and timings
+SERVER_TIMING_ENABLED = False
+INTERNAL_IPS          = []
+
+# MetricsMiddleware serves /metrics to clients in INTERNAL_IPS, or to everyone when METRICS_ENABLED is set;
+# anyone else gets the regular 404
+METRICS_ENABLED = False
+
+# seso.middleware.RequestLoggingMiddleware logs a sample of requests per route (keys are URL patterns),
+# plus every 5xx and every request slower than REQUEST_LOG_SLOW_MS; bodies are truncated and uploads elided
+REQUEST_LOG_SAMPLE_RATES = {
+    "default"           : 0.01,
+    "/galleries/images" : 0,
+    "/users/namecard"   : 0,
+}
+REQUEST_LOG_SLOW_MS          = 1000
+REQUEST_LOG_MAX_BODY         = 2048
+REQUEST_LOG_REDACTED_HEADERS = ("Authorization", "Proxy-Authorization", "Cookie")
+
 ##CORS
 CORS_ORIGIN_ALLOW_ALL=True
 CORS_ALLOW_CREDENTIALS=True
@@ -161,16 +302,25 @@ CORS_ALLOW_HEADERS = (
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-primary-pin',
 		#만약 허용해야할 추가적인 헤더키가 있다면?(사용자정의 키) 여기에 추가하면 됩니다.
 )
 
-# logger
-boto3_session = Session(
-    aws_access_key_id     = AWS_IAM_ACCESS_KEY_ID,
-    aws_secret_access_key = AWS_IAM_SECRET_ACCESS_KEY,
-    region_name           = AWS_REGION_NAME
+CORS_EXPOSE_HEADERS = (
+    'x-primary-pin',
 )
 
+# logger
+# Records are queued by core.log.QueuedHandler and shipped to CloudWatch in batches from a background thread;
+# when the queue is full or the sink fails the records are dropped and counted in seso_log_records_dropped_total.
+# manage.py test ships to a local file instead of CloudWatch
+TESTING = sys.argv[1:2] == ['test']
+
+if TESTING:
+    LOG_SINK = {'sink' : 'logging.FileHandler', 'sink_options' : {'filename' : os.path.join(tempfile.gettempdir(), 'seso-test.log')}}
+else:
+    LOG_SINK = {'sink' : 'core.log.cloudwatch_handler', 'sink_options' : {'log_group' : AWS_LOG_GROUP, 'stream_name' : AWS_LOG_STREAM}}
+
 LOGGING = {
     'disable_existing_loggers': False,
     'version': 1,
@@ -182,12 +332,14 @@ LOGGING = {
     },
     'handlers': {
         'watchtower': {
-            'level'        : 'WARNING',
-            'class'        : 'watchtower.CloudWatchLogHandler',
-            'boto3_session': boto3_session,
-            'log_group'    : AWS_LOG_GROUP,
-            'stream_name'  : AWS_LOG_STREAM,
-            'formatter'    : 'aws'
+            'level'         : 'INFO',
+            '()'            : 'core.log.QueuedHandler',
+            'sink'          : LOG_SINK['sink'],
+            'sink_options'  : LOG_SINK['sink_options'],
+            'capacity'      : 10000,
+            'batch_size'    : 100,
+            'flush_interval': 5,
+            'formatter'     : 'aws'
         },
     },
     'loggers': {
@@ -200,6 +352,16 @@ LOGGING = {
             'handlers' : ['watchtower'],
             'level'    : 'WARNING',
             'propagate': False,
+        },
+        'seso.sql': {
+            'handlers' : ['watchtower'],
+            'level'    : 'INFO',
+            'propagate': False,
+        },
+        'seso.request': {
+            'handlers' : ['watchtower'],
+            'level'    : 'INFO',
+            'propagate': False,
         }
     }
 }
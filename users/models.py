@@ -16,6 +16,11 @@ class User(TimeStampModel):
 
     class Meta:
         db_table = 'users'
+        indexes  = [
+            models.Index(fields=['kakao'], name='users_kakao_idx'),
+            models.Index(fields=['naver'], name='users_naver_idx'),
+            models.Index(fields=['nickname'], name='users_nickname_idx'),
+        ]
 
 class History(models.Model):
     user     = models.ForeignKey('User', on_delete=models.CASCADE)
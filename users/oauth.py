@@ -0,0 +1,59 @@
+import asyncio
+import httpx
+import time
+import weakref
+
+from django.conf       import settings
+from django.core.cache import cache
+
+from core.metrics import OAUTH_DURATION
+from users.models import User
+
+http_clients = weakref.WeakKeyDictionary()
+
+def get_http_client(provider):
+    clients = http_clients.setdefault(asyncio.get_running_loop(), {})
+
+    if provider not in clients:
+        config            = settings.OAUTH_PROVIDERS[provider]
+        clients[provider] = httpx.AsyncClient(
+            timeout   = config["timeout"],
+            transport = httpx.AsyncHTTPTransport(
+                retries = config["retries"],
+                limits  = httpx.Limits(
+                    max_connections           = config["max_connections"],
+                    max_keepalive_connections = config["max_connections"]
+                )
+            )
+        )
+    return clients[provider]
+
+async def fetch_profile(provider, access_token):
+    start   = time.perf_counter()
+    outcome = "error"
+    try:
+        response = await get_http_client(provider).get(
+            settings.OAUTH_PROVIDERS[provider]["profile_url"],
+            headers = {'Authorization': f'Bearer {access_token}'}
+        )
+        outcome = "ok"
+    finally:
+        OAUTH_DURATION.labels(provider, outcome).observe(time.perf_counter() - start)
+    return response.json()
+
+def identity_key(provider, provider_id):
+    return f"oauth-user:{provider}:{provider_id}"
+
+def resolve_user(provider, provider_id):
+    key     = identity_key(provider, provider_id)
+    user_id = cache.get(key)
+
+    if user_id is not None:
+        return user_id, False
+
+    user, created = User.objects.get_or_create(**{provider : provider_id})
+    cache.set(key, user.id, settings.OAUTH_IDENTITY_CACHE_TIMEOUT)
+    return user.id, created
+
+def forget_identities(user):
+    cache.delete_many([identity_key(provider, getattr(user, provider)) for provider in settings.OAUTH_PROVIDERS if getattr(user, provider)])
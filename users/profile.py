@@ -0,0 +1,90 @@
+from django.conf       import settings
+from django.core.cache import cache
+
+from core.db.routers  import primary_reads
+from core.utils       import CursorPaginator, cache_version, stored_version, bump_cache_version, make_etag
+from galleries.models import Gallery, Posting, Bookmark, Like, Comment
+from galleries.utils  import gallery_catalogue
+from users.models     import User, History
+
+POSTING_FIELDS = ("gallery_id", "id", "title", "content", "created_at")
+
+def namecard(user_id):
+    card = User.objects.filter(id=user_id).values("image", "name", "slogan", "introduce", "email", "location").first()
+    if card is None:
+        return None
+
+    card["works"] = list(History.objects.filter(user_id=user_id).values("year", "title", "subtitle"))
+    return card
+
+def bookmarks(user_id):
+    return Gallery.objects.filter(id__in=Bookmark.objects.filter(user_id=user_id).values("gallery_id")).values("id", "name", "image")
+
+def bookmark_row(gallery):
+    return {
+        "gallery_id"    : gallery["id"],
+        "gallery_name"  : gallery["name"],
+        "gallery_image" : gallery["image"]
+    }
+
+def postings(user_id):
+    return Posting.objects.filter(user_id=user_id).values(*POSTING_FIELDS)
+
+def liked_postings(user_id):
+    return Posting.objects.filter(id__in=Like.objects.filter(user_id=user_id).values("posting_id")).values(*POSTING_FIELDS)
+
+def commented_postings(user_id):
+    return Posting.objects.filter(id__in=Comment.objects.filter(user_id=user_id).values("posting_id")).values(*POSTING_FIELDS)
+
+SECTIONS = {
+    "bookmarks"          : (bookmarks, ("id",), bookmark_row),
+    "postings"           : (postings, ("created_at", "id"), dict),
+    "likes"              : (liked_postings, ("created_at", "id"), dict),
+    "commented_postings" : (commented_postings, ("created_at", "id"), dict),
+}
+
+def profile_version(user_id):
+    return cache_version(f"profile-version:{user_id}")
+
+def invalidate_profile(user_id):
+    bump_cache_version(f"profile-version:{user_id}")
+
+def profile_etag(request, user_id=None):
+    user_id            = user_id or request.user.id
+    version, catalogue = stored_version(f"profile-version:{user_id}"), gallery_catalogue.etag()
+    return version and catalogue and make_etag(user_id, version, catalogue, request.user.id, request.GET.urlencode())
+
+def cached(user_id, part, build):
+    key   = f"profile:{user_id}:{profile_version(user_id)}:{gallery_catalogue.etag()}:{part}"
+    value = cache.get(key)
+
+    if value is None:
+        with primary_reads():
+            value = build()
+        if value is not None:
+            cache.set(key, value, settings.PROFILE_CACHE_TIMEOUT)
+    return value
+
+def profile_section(user_id, section, cursor=""):
+    if cursor:
+        queryset, ordering, row = SECTIONS[section]
+        CursorPaginator(queryset(user_id), settings.PROFILE_PAGE_SIZE, ordering).decode(cursor)
+    return cached(user_id, f"{section}:{make_etag(cursor)}", lambda: build_section(user_id, section, cursor))
+
+def build_section(user_id, section, cursor):
+    queryset, ordering, row = SECTIONS[section]
+    rows, next_cursor       = CursorPaginator(queryset(user_id), settings.PROFILE_PAGE_SIZE, ordering).get_page(cursor)
+    return [row(item) for item in rows], next_cursor
+
+def profile(user_id):
+    return cached(user_id, "profile", lambda: build_profile(user_id))
+
+def build_profile(user_id):
+    card = namecard(user_id)
+    if card is None:
+        return None
+
+    data = {"namecard" : card, "next_cursors" : {}}
+    for section in SECTIONS:
+        data[section], data["next_cursors"][section] = build_section(user_id, section, "")
+    return data
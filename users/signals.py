@@ -0,0 +1,63 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch          import receiver
+
+from galleries.models import Posting, Bookmark, Like, Comment
+from galleries.utils  import bump_versions
+from users.models     import User, History
+from users.oauth      import forget_identities
+from users.profile    import invalidate_profile
+from users.utils      import user_cache
+
+DISPLAYED_FIELDS = ("nickname",)
+
+def displayed_values(user):
+    return {field : user.__dict__.get(field) for field in DISPLAYED_FIELDS}
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    instance._displayed = displayed_values(instance)
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    user_cache.evict(instance.id)
+    invalidate_profile(instance.id)
+
+    if created or update_fields is not None and not set(update_fields) & set(DISPLAYED_FIELDS):
+        return
+
+    displayed = displayed_values(instance)
+    if displayed != instance._displayed:
+        instance._displayed = displayed
+        bump_versions("postings-version", Posting.objects.filter(user_id=instance.id).values_list("gallery_id", flat=True))
+        bump_versions("comments-version", Comment.objects.filter(user_id=instance.id).values_list("posting_id", flat=True))
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    user_cache.evict(instance.id)
+    forget_identities(instance)
+    invalidate_profile(instance.id)
+
+@receiver(post_save, sender=History)
+@receiver(post_delete, sender=History)
+@receiver(post_save, sender=Bookmark)
+@receiver(post_delete, sender=Bookmark)
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def user_row_changed(sender, instance, **kwargs):
+    invalidate_profile(instance.user_id)
+
+@receiver(post_save, sender=Posting)
+def posting_saved(sender, instance, created, **kwargs):
+    invalidate_profile(instance.user_id)
+
+    if not created:
+        readers = set(Like.objects.filter(posting_id=instance.id).values_list("user_id", flat=True))
+        readers.update(Comment.objects.filter(posting_id=instance.id).values_list("user_id", flat=True))
+        for user_id in readers:
+            invalidate_profile(user_id)
+
+@receiver(post_delete, sender=Posting)
+def posting_deleted(sender, instance, **kwargs):
+    invalidate_profile(instance.user_id)
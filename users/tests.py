@@ -1,12 +1,27 @@
+import asyncio
+import json
 import jwt
-
-from django.test    import TestCase, Client
+import threading
+import time
+import warnings
+
+from http.server       import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.conf       import settings
+from django.core.cache import cache, CacheKeyWarning
+from django.db         import connection
+from asgiref.testing   import ApplicationCommunicator
+from django.test       import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 from unittest.mock    import patch, MagicMock
 from users.models     import History, User
+from core.queryplan   import full_table_scans
+from users.oauth      import fetch_profile
+from users.utils      import TokenCache, user_cache
+from seso.asgi        import application
 from my_settings      import SECRET_KEY, ALGORITHMS
-from galleries.models import Gallery, Posting, Bookmark
+from galleries.models import Gallery, Posting, Bookmark, Like, Comment
 
 class NamecardPOSTTest(TestCase):
     def setUp(self):
@@ -125,38 +140,88 @@ class NamecardGETTest(TestCase):
                 }]}})
         self.assertEqual(response.status_code, 200)
 
-class KaKaoSignInTest(TestCase):
-    def setUp(self):
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        self.server.requests.append((self.client_address, self.headers["Authorization"]))
+
+        body = json.dumps(self.server.profiles[self.path]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
         pass
 
+class FakeProviderMixin:
+    profiles = {
+        "/v2/user/me" : {
+            'id'           : '12387623842873291',
+            'connected_at' : '2021-08-25T09:16:53Z',
+            'properties'   : {'nickname': 'Jun'},
+            'kakao_account': {
+                'profile_nickname_needs_agreement': False,
+                'profile'                         : {'nickname': '장감자'},
+                'has_email'                       : True,
+                'email_needs_agreement'           : False,
+                'is_email_valid'                  : True,
+                'is_email_verified'               : True,
+                'email'                           : 'potato@naver.com'
+            }
+        },
+        "/v1/nid/me" : {
+            'response' : {
+                'id' : 'aldskjflksjflkasjlfkjlk1j23123'
+            }
+        },
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        cls.provider          = ThreadingHTTPServer(("127.0.0.1", 0), FakeProviderHandler)
+        cls.provider.profiles = cls.profiles
+        cls.provider.delay    = 0
+        cls.provider.requests = []
+        threading.Thread(target=cls.provider.serve_forever, daemon=True).start()
+
+        url          = f"http://127.0.0.1:{cls.provider.server_port}"
+        cls.settings = override_settings(OAUTH_PROVIDERS = {
+            "kakao" : {"profile_url" : url + "/v2/user/me", "timeout" : 3, "retries" : 0, "max_connections" : 10},
+            "naver" : {"profile_url" : url + "/v1/nid/me", "timeout" : 3, "retries" : 0, "max_connections" : 10},
+        })
+        cls.settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings.disable()
+        cls.provider.shutdown()
+        cls.provider.server_close()
+
+    def setUp(self):
+        cache.clear()
+        self.provider.delay    = 0
+        self.provider.requests = []
+
+class FakeProviderTestCase(FakeProviderMixin, TestCase):
+    pass
+
+class KaKaoSignInTest(FakeProviderTestCase):
     def tearDown(self):
         User.objects.all().delete()
 
-    @patch('users.views.requests')
-    def test_kakao_social_login_success(self, mocked_requests):
-        client = Client()
-
-        class MockedResponse:
-            def json(self):
-                return {
-                    'id'           : '12387623842873291',
-                    'connected_at' : '2021-08-25T09:16:53Z',
-                    'properties'   : {'nickname': 'Jun'},
-                    'kakao_account': {
-                        'profile_nickname_needs_agreement': False,
-                        'profile'                         : {'nickname': '장감자'},
-                        'has_email'                       : True,
-                        'email_needs_agreement'           : False,
-                        'is_email_valid'                  : True,
-                        'is_email_verified'               : True,
-                        'email'                           : 'potato@naver.com'
-                    }
-                }
-        mocked_requests.get = MagicMock(return_value = MockedResponse())
-        headers             = {'HTTP_Authorization' : 'FAKE_TOKEN'}
-        response            = client.post('/users/kakao', content_type='application/json', **headers)
+    def test_kakao_social_login_success(self):
+        client   = Client()
+        headers  = {'HTTP_Authorization' : 'FAKE_TOKEN'}
+        response = client.post('/users/kakao', content_type='application/json', **headers)
 
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.provider.requests[0][1], 'Bearer FAKE_TOKEN')
 
         token    = response.json()['TOKEN']
         user_id  = jwt.decode(token, SECRET_KEY, algorithms=ALGORITHMS)['id']
@@ -164,35 +229,60 @@ class KaKaoSignInTest(TestCase):
 
         self.assertEqual(kakao_id, '12387623842873291')
 
-    @patch('users.views.requests')
-    def test_kakao_social_login_invalid_token(self, mocked_requests):
+    def test_kakao_social_login_invalid_token(self):
         client   = Client()
         response = client.post('/users/kakao', content_type='application/json')
 
         self.assertEqual(response.json(), {'MESSAGE' : 'INVALID_TOKEN'})
         self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.provider.requests, [])
 
-class NaverSignInTest(TestCase):
-    def setUp(self):
-        pass
+    def test_kakao_social_login_provider_timeout(self):
+        providers = {name : dict(config) for name, config in settings.OAUTH_PROVIDERS.items()}
+        providers["kakao"]["timeout"] = 0.1
+        self.provider.delay           = 0.5
 
-    def tearDown(self):
+        with override_settings(OAUTH_PROVIDERS = providers):
+            response = Client().post('/users/kakao', content_type='application/json', HTTP_Authorization='FAKE_TOKEN')
+
+        self.assertEqual(response.json(), {'MESSAGE' : 'PROVIDER_UNAVAILABLE'})
+        self.assertEqual(response.status_code, 502)
+
+    def test_kakao_repeat_login_skips_user_lookup(self):
+        client  = Client()
+        headers = {'HTTP_Authorization' : 'FAKE_TOKEN'}
+        first   = client.post('/users/kakao', content_type='application/json', **headers).json()
+
+        with self.assertNumQueries(0):
+            second = client.post('/users/kakao', content_type='application/json', **headers).json()
+
+        self.assertEqual(first['NEEDNICKNAME'], True)
+        self.assertEqual(second['NEEDNICKNAME'], False)
+        self.assertEqual(
+            jwt.decode(first['TOKEN'], SECRET_KEY, algorithms=ALGORITHMS),
+            jwt.decode(second['TOKEN'], SECRET_KEY, algorithms=ALGORITHMS)
+        )
+
+    def test_kakao_login_after_user_deleted(self):
+        client  = Client()
+        headers = {'HTTP_Authorization' : 'FAKE_TOKEN'}
+        client.post('/users/kakao', content_type='application/json', **headers)
         User.objects.all().delete()
 
-    @patch('users.views.requests')
-    def test_naver_social_login_success(self, mocked_requests):
-        client = Client()
+        response = client.post('/users/kakao', content_type='application/json', **headers).json()
+        user_id  = jwt.decode(response['TOKEN'], SECRET_KEY, algorithms=ALGORITHMS)['id']
 
-        class MockedResponse:
-            def json(self):
-                return {
-                    'response' : {
-                        'id' : 'aldskjflksjflkasjlfkjlk1j23123'
-                    }
-                }
-        mocked_requests.get = MagicMock(return_value = MockedResponse())
-        headers             = {'HTTP_Authorization' : 'FAKE_TOKEN'}
-        response            = client.post('/users/naver', content_type='application/json', **headers)
+        self.assertEqual(response['NEEDNICKNAME'], True)
+        self.assertEqual(User.objects.get(id=user_id).kakao, '12387623842873291')
+
+class NaverSignInTest(FakeProviderTestCase):
+    def tearDown(self):
+        User.objects.all().delete()
+
+    def test_naver_social_login_success(self):
+        client   = Client()
+        headers  = {'HTTP_Authorization' : 'FAKE_TOKEN'}
+        response = client.post('/users/naver', content_type='application/json', **headers)
 
         self.assertEqual(response.status_code, 200)
 
@@ -202,14 +292,79 @@ class NaverSignInTest(TestCase):
 
         self.assertEqual(naver_id, 'aldskjflksjflkasjlfkjlk1j23123')
 
-    @patch('users.views.requests')
-    def test_naver_social_login_invalid_token(self, mocked_requests):
+    def test_naver_social_login_invalid_token(self):
         client   = Client()
         response = client.post('/users/naver', content_type='application/json')
 
         self.assertEqual(response.json(), {'MESSAGE' : 'INVALID_TOKEN'})
         self.assertEqual(response.status_code, 400)
 
+class ProviderClientTest(FakeProviderTestCase):
+    def test_concurrent_lookups_do_not_queue(self):
+        self.provider.delay = 0.3
+
+        async def lookups():
+            start = time.monotonic()
+            await asyncio.gather(*[fetch_profile("naver", f"TOKEN{i}") for i in range(5)])
+            return time.monotonic() - start
+
+        self.assertLess(asyncio.run(lookups()), 1.0)
+        self.assertEqual(len(self.provider.requests), 5)
+
+    def test_connections_are_kept_alive(self):
+        async def lookups():
+            for i in range(3):
+                await fetch_profile("kakao", f"TOKEN{i}")
+
+        asyncio.run(lookups())
+        self.assertEqual(len({address for address, token in self.provider.requests}), 1)
+
+class AsgiLoginConcurrencyTest(FakeProviderMixin, TransactionTestCase):
+    def tearDown(self):
+        User.objects.all().delete()
+
+    async def request(self, path, headers=()):
+        scope = {
+            "type"         : "http",
+            "asgi"         : {"version" : "3.0"},
+            "http_version" : "1.1",
+            "method"       : "POST",
+            "scheme"       : "http",
+            "path"         : path,
+            "raw_path"     : path.encode(),
+            "query_string" : b"",
+            "root_path"    : "",
+            "headers"      : [(b"content-type", b"application/json"), *headers],
+            "client"       : ("127.0.0.1", 50000),
+            "server"       : ("testserver", 80),
+        }
+        communicator = ApplicationCommunicator(application, scope)
+        await communicator.send_input({"type" : "http.request", "body" : b""})
+        start = await communicator.receive_output(5)
+        body  = await communicator.receive_output(5)
+        return start["status"], body["body"], time.monotonic()
+
+    def test_logins_wait_on_provider_concurrently(self):
+        self.provider.delay = 0.5
+
+        async def requests():
+            start  = time.monotonic()
+            logins = [
+                asyncio.ensure_future(self.request("/users/kakao", [(b"authorization", f"TOKEN{i}".encode())]))
+                for i in range(4)
+            ]
+            await asyncio.sleep(0.1)
+            ping = await self.request("/ping")
+            return start, ping, await asyncio.gather(*logins)
+
+        start, ping, logins = asyncio.run(requests())
+
+        self.assertEqual(ping[:2], (200, b"pong"))
+        self.assertLess(ping[2] - start, 0.4)
+        self.assertEqual([status for status, body, finished in logins], [200] * 4)
+        self.assertLess(max(finished for status, body, finished in logins) - start, 1.5)
+        self.assertEqual(len(self.provider.requests), 4)
+
 class NicknameTest(TestCase):
     def setUp(self):
         User.objects.create(
@@ -414,3 +569,236 @@ class ProfileGETTest(TestCase):
         response = client.get("/users/100/profile", **header)
         self.assertEqual(response.json(), {'MESSAGE' : 'NOT_FOUND_USER'})
         self.assertEqual(response.status_code, 400)
+
+class LoginCacheTest(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        user       = User.objects.create(nickname = "cached")
+        self.token = jwt.encode({"id" : user.id}, SECRET_KEY, algorithm = ALGORITHMS)
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+    def test_cached_token_skips_user_query(self):
+        client = Client()
+        header = {"HTTP_Authorization" : self.token}
+
+        with self.assertNumQueries(2):
+            response = client.get("/galleries/bookmark-list", **header)
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(1):
+            response = client.get("/galleries/bookmark-list", **header)
+        self.assertEqual(response.status_code, 200)
+
+    def test_deleted_user_is_evicted(self):
+        client = Client()
+        header = {"HTTP_Authorization" : self.token}
+
+        client.get("/galleries/bookmark-list", **header)
+        User.objects.all().delete()
+
+        response = client.get("/galleries/bookmark-list", **header)
+        self.assertEqual(response.json(), {"MESSAGE" : "INVALID_USER"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_eviction_reaches_other_workers(self):
+        user   = User.objects.get(nickname = "cached")
+        worker = TokenCache()
+        worker.set(self.token, user.id)
+        self.assertEqual(worker.get(self.token), user.id)
+
+        user.delete()
+
+        self.assertIsNone(worker.get(self.token))
+
+    def test_full_user_loaded_on_demand(self):
+        client = Client()
+        header = {"HTTP_Authorization" : self.token}
+
+        client.get("/users/namecard", **header)
+        response = client.post("/users/nickname", content_type = "application/json", data = {"nickname" : "renamed"}, **header)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(User.objects.get(nickname = "renamed").nickname, "renamed")
+
+class ProfileSectionTest(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        cache.clear()
+        gallery = Gallery.objects.create(name = "test", image = "image.jpg")
+        user    = User.objects.create(nickname = "profile", name = "James")
+
+        History.objects.create(user = user, year = 2021, title = "title", subtitle = "subtitle")
+        Bookmark.objects.create(user = user, gallery = gallery)
+        Posting.objects.bulk_create([
+            Posting(gallery = gallery, title = f"testpost{i}", content = f"testtext{i}", user = user) for i in range(25)
+        ])
+
+        postings = list(Posting.objects.order_by("id"))
+        Like.objects.bulk_create([Like(user = user, posting = posting) for posting in postings[:3]])
+        Comment.objects.bulk_create([Comment(user = user, posting = postings[0], content = "comment")] * 2)
+
+        self.user   = user
+        self.header = {"HTTP_Authorization" : jwt.encode({"id" : user.id}, SECRET_KEY, algorithm = ALGORITHMS)}
+
+    def tearDown(self):
+        User.objects.all().delete()
+        Gallery.objects.all().delete()
+
+    def test_profile_query_budget(self):
+        client = Client()
+        client.get("/galleries/bookmark-list", **self.header)
+
+        with self.assertNumQueries(6):
+            response = client.get(f"/users/{self.user.id}/profile", **self.header)
+
+        data = response.json()["MESSAGE"]
+        self.assertEqual(data["namecard"]["works"], [{"year" : 2021, "title" : "title", "subtitle" : "subtitle"}])
+        self.assertEqual(len(data["postings"]), 20)
+        self.assertEqual(len(data["likes"]), 3)
+        self.assertEqual(len(data["commented_postings"]), 1)
+        self.assertEqual(data["bookmarks"][0]["gallery_name"], "test")
+        self.assertIsNotNone(data["next_cursors"]["postings"])
+        self.assertIsNone(data["next_cursors"]["likes"])
+        self.assertEqual(data["is_editable"], True)
+
+    def test_profile_section_pages(self):
+        client = Client()
+        data   = client.get("/users/myprofile", **self.header).json()["MESSAGE"]
+
+        response = client.get("/users/myprofile", {"section" : "postings", "cursor" : data["next_cursors"]["postings"]}, **self.header)
+        ids      = [row["id"] for row in data["postings"] + response.json()["MESSAGE"]]
+
+        self.assertEqual(response.json()["IS_NEXT"], False)
+        self.assertEqual(ids, list(Posting.objects.order_by("created_at", "id").values_list("id", flat = True)))
+
+    def test_profile_invalid_section(self):
+        client   = Client()
+        response = client.get("/users/myprofile", {"section" : "secrets"}, **self.header)
+
+        self.assertEqual(response.json(), {"MESSAGE" : "INVALID_SECTION"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_profile_malformed_cursor(self):
+        client = Client()
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", CacheKeyWarning)
+            for cursor in ("not a cursor", "\x01", "A" * 300):
+                response = client.get("/users/myprofile", {"section" : "postings", "cursor" : cursor}, **self.header)
+                self.assertEqual(response.json(), {"MESSAGE" : "INVALID_CURSOR"})
+                self.assertEqual(response.status_code, 400)
+
+            cursor = client.get("/users/myprofile", **self.header).json()["MESSAGE"]["next_cursors"]["postings"]
+            self.assertEqual(client.get("/users/myprofile", {"section" : "postings", "cursor" : cursor}, **self.header).status_code, 200)
+
+class ProfileCacheTest(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        cache.clear()
+        gallery = Gallery.objects.create(name = "test", image = "image.jpg")
+        owner   = User.objects.create(nickname = "owner")
+        viewer  = User.objects.create(nickname = "viewer")
+        posting = Posting.objects.create(gallery = gallery, title = "before", content = "content", user = owner)
+        Like.objects.create(user = viewer, posting = posting)
+
+        self.owner   = owner
+        self.posting = posting
+        self.header  = {"HTTP_Authorization" : jwt.encode({"id" : viewer.id}, SECRET_KEY, algorithm = ALGORITHMS)}
+        self.viewer  = viewer
+
+    def tearDown(self):
+        User.objects.all().delete()
+        Gallery.objects.all().delete()
+
+    def test_profile_served_from_cache(self):
+        client = Client()
+        client.get(f"/users/{self.owner.id}/profile", **self.header)
+
+        with self.assertNumQueries(0):
+            response = client.get(f"/users/{self.owner.id}/profile", **self.header)
+
+        self.assertEqual(response.json()["MESSAGE"]["is_editable"], False)
+        self.assertEqual(response.json()["MESSAGE"]["postings"][0]["title"], "before")
+
+    def test_profile_invalidated_by_writes(self):
+        client = Client()
+        client.get(f"/users/{self.owner.id}/profile", **self.header)
+        client.get("/users/myprofile", **self.header)
+
+        History.objects.create(user = self.owner, year = 2021, title = "title", subtitle = "subtitle")
+        self.posting.title = "after"
+        self.posting.save()
+
+        owner  = client.get(f"/users/{self.owner.id}/profile", **self.header).json()["MESSAGE"]
+        viewer = client.get("/users/myprofile", **self.header).json()["MESSAGE"]
+
+        self.assertEqual(len(owner["namecard"]["works"]), 1)
+        self.assertEqual(owner["postings"][0]["title"], "after")
+        self.assertEqual(viewer["likes"][0]["title"], "after")
+
+    def test_profile_not_modified(self):
+        client   = Client()
+        url      = f"/users/{self.owner.id}/profile"
+        response = client.get(url, **self.header)
+
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH = response["ETag"], **self.header).status_code, 304)
+
+        self.posting.title = "after"
+        self.posting.save()
+
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH = response["ETag"], **self.header).status_code, 200)
+
+    @patch("users.signals.bump_versions")
+    def test_listings_bumped_only_when_nickname_changes(self, mocked_bump):
+        owner        = User.objects.get(id = self.owner.id)
+        owner.slogan = "slogan"
+        owner.save()
+        owner.nickname = "renamed"
+        owner.save(update_fields = ["slogan"])
+        self.assertFalse(mocked_bump.called)
+
+        owner.save()
+        self.assertEqual([call.args[0] for call in mocked_bump.call_args_list], ["postings-version", "comments-version"])
+
+        mocked_bump.reset_mock()
+        owner.save()
+        self.assertFalse(mocked_bump.called)
+
+class QueryPlanTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.user = User.objects.create(nickname = "owner", kakao = "1234", naver = "abcd")
+        gallery   = Gallery.objects.create(name = "test", image = "image.jpg")
+        posting   = Posting.objects.create(gallery = gallery, title = "title", content = "content", user = self.user)
+        History.objects.create(user = self.user, year = 2021, title = "title", subtitle = "subtitle")
+        Bookmark.objects.create(user = self.user, gallery = gallery)
+        Like.objects.create(user = self.user, posting = posting)
+        Comment.objects.create(user = self.user, posting = posting, content = "comment")
+
+        self.header = {"HTTP_Authorization" : jwt.encode({"id" : self.user.id}, SECRET_KEY, algorithm = ALGORITHMS)}
+
+    def test_profile_read_paths(self):
+        urls = ["/users/myprofile", f"/users/{self.user.id}/profile", "/users/namecard"]
+        urls += [f"/users/myprofile?section={section}" for section in ("bookmarks", "postings", "likes", "commented_postings")]
+
+        for url in urls:
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(Client().get(url, **self.header).status_code, 200)
+
+            for query in queries.captured_queries:
+                self.assertEqual(full_table_scans(query["sql"]), [], query["sql"])
+
+    def test_login_lookups(self):
+        lookups = [
+            User.objects.filter(kakao = "1234"),
+            User.objects.filter(naver = "abcd"),
+            User.objects.filter(nickname = "owner"),
+        ]
+
+        for queryset in lookups:
+            sql, params = queryset.query.sql_with_params()
+            self.assertEqual(full_table_scans(sql, params), [], sql)
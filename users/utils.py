@@ -1,17 +1,87 @@
 import jwt
+import threading
+import time
 
-from django.http     import JsonResponse
+from collections             import OrderedDict
+from django.conf             import settings
+from django.utils.functional import SimpleLazyObject
 
+from core.http       import JsonResponse
+from core.utils      import bump_cache_version, cache_version, stored_version
 from my_settings     import SECRET_KEY, ALGORITHMS
 from users.models    import User
 
+class TokenCache:
+    def __init__(self):
+        self.lock    = threading.Lock()
+        self.entries = OrderedDict()
+
+    def version_key(self, user_id):
+        return f"user-version:{user_id}"
+
+    def get(self, token):
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is None:
+                return None
+
+            expires_at, user_id, version = entry
+            if expires_at < time.monotonic():
+                del self.entries[token]
+                return None
+
+            self.entries.move_to_end(token)
+
+        if version != stored_version(self.version_key(user_id), settings.USER_CACHE_TIMEOUT):
+            return None
+        return user_id
+
+    def set(self, token, user_id):
+        version = cache_version(self.version_key(user_id), settings.USER_CACHE_TIMEOUT)
+        with self.lock:
+            self.entries[token] = (time.monotonic() + settings.USER_CACHE_TIMEOUT, user_id, version)
+            self.entries.move_to_end(token)
+            while len(self.entries) > settings.USER_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def evict(self, user_id):
+        bump_cache_version(self.version_key(user_id), settings.USER_CACHE_TIMEOUT)
+        with self.lock:
+            for token in [token for token, (_, cached_id, _) in self.entries.items() if cached_id == user_id]:
+                del self.entries[token]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+user_cache = TokenCache()
+
+class AuthenticatedUser(SimpleLazyObject):
+    def __init__(self, user_id):
+        self.__dict__["user_id"] = user_id
+        super().__init__(lambda: User.objects.get(id=user_id))
+
+    @property
+    def id(self):
+        return self.user_id
+
+    pk = id
+
 def login_decorator(func):
     def wrapper(self, request, *args, **kwargs):
         try:
             access_token = request.headers.get("Authorization")
-            payload      = jwt.decode(access_token, SECRET_KEY, algorithms=ALGORITHMS)
-            user         = User.objects.get(id=payload["id"])
-            request.user = user
+            user_id      = user_cache.get(access_token)
+
+            if user_id is None:
+                payload = jwt.decode(access_token, SECRET_KEY, algorithms=ALGORITHMS)
+                user_id = payload["id"]
+
+                if not User.objects.filter(id=user_id).exists():
+                    raise User.DoesNotExist
+                user_cache.set(access_token, user_id)
+
+            request.user = AuthenticatedUser(user_id)
 
         except jwt.exceptions.DecodeError:
             return JsonResponse({"MESSAGE" : "INVALID_TOKEN"}, status=400)
@@ -19,4 +89,4 @@ def login_decorator(func):
         except User.DoesNotExist:
             return JsonResponse({"MESSAGE" : "INVALID_USER"}, status=400)
         return func(self, request, *args, **kwargs)
-    return wrapper
\ No newline at end of file
+    return wrapper
@@ -1,18 +1,27 @@
-import jwt, json, requests
-
-from django.http  import JsonResponse
-from django.views import View
-
-from users.models     import User, History
-from core.utils       import CloudStorage
-from users.utils      import login_decorator
-from my_settings      import AWS_IAM_ACCESS_KEY_ID, AWS_S3_STORAGE_BUCKET_NAME, AWS_IAM_SECRET_ACCESS_KEY, AWS_S3_BUCKET_URL, SECRET_KEY, ALGORITHMS
-from galleries.models import Posting, Bookmark, Like, Comment
+import jwt, json, httpx
+
+from asgiref.sync                 import sync_to_async
+from django.utils.decorators      import method_decorator
+from django.views                 import View
+from django.views.decorators.http import condition
+
+from core.http           import JsonResponse
+from users.models        import User, History
+from users.profile       import SECTIONS, profile, profile_section, profile_etag
+from core.uploadhandlers import S3UploadHandler
+from core.utils          import InvalidCursor
+from core.views          import AsyncView
+from users.oauth         import fetch_profile, resolve_user
+from users.utils         import login_decorator
+from my_settings         import AWS_S3_BUCKET_URL, SECRET_KEY, ALGORITHMS
 
 class NamecardView(View):
     @login_decorator
     def post(self, request):
         try:
+            upload_handler          = S3UploadHandler(request)
+            request.upload_handlers = [upload_handler]
+
             user      = request.user
             name      = request.POST.get("userName")
             introduce = request.POST.get("introduce")
@@ -24,10 +33,11 @@ class NamecardView(View):
             titles    = request.POST.getlist("historyTitle")
             subtitles = request.POST.getlist("historySubtitle")
 
+            if upload_handler.error:
+                return JsonResponse({"MESSAGE" : upload_handler.error}, status=400)
+
             if image:
-                cloud_storage = CloudStorage(id = AWS_IAM_ACCESS_KEY_ID, password = AWS_IAM_SECRET_ACCESS_KEY, bucket = AWS_S3_STORAGE_BUCKET_NAME)
-                upload_key    = cloud_storage.upload_file(image)
-                image         = AWS_S3_BUCKET_URL + upload_key
+                image = AWS_S3_BUCKET_URL + image.key
                 
             user.name      = name if name else None
             user.introduce = introduce if introduce else None
@@ -67,25 +77,19 @@ class NamecardView(View):
         }
         return JsonResponse({"MESSAGE":data}, status=200)
 
-class KakaoLoginView(View):
-    def post(self, request):
+class KakaoLoginView(AsyncView):
+    async def post(self, request):
         try:
             access_token = request.headers.get('Authorization')
 
             if not access_token:
                 return JsonResponse({'MESSAGE' : 'INVALID_TOKEN'}, status=400)
 
-            response = requests.get(
-                "https://kapi.kakao.com/v2/user/me",
-                headers = {'Authorization': f'Bearer {access_token}'},
-                timeout=3
-            ).json()
+            response = await fetch_profile("kakao", access_token)
 
-            user, created = User.objects.get_or_create(
-                kakao = response['id']
-            )
+            user_id, created = await sync_to_async(resolve_user)("kakao", response['id'])
 
-            token = jwt.encode({'id' : user.id}, SECRET_KEY, algorithm = ALGORITHMS)
+            token = jwt.encode({'id' : user_id}, SECRET_KEY, algorithm = ALGORITHMS)
 
             return JsonResponse({
                 'MESSAGE'      : 'SUCCESS',
@@ -96,25 +100,22 @@ class KakaoLoginView(View):
         except KeyError:
             return JsonResponse({'MESSAGE' : 'KEY_ERROR'}, status=400)
 
-class NaverLoginView(View):
-    def post(self, request):
+        except httpx.HTTPError:
+            return JsonResponse({'MESSAGE' : 'PROVIDER_UNAVAILABLE'}, status=502)
+
+class NaverLoginView(AsyncView):
+    async def post(self, request):
         try:
             access_token = request.headers.get('Authorization')
 
             if not access_token:
                 return JsonResponse({'MESSAGE' : 'INVALID_TOKEN'}, status=400)
 
-            response = requests.get(
-                "https://openapi.naver.com/v1/nid/me",
-                headers = {'Authorization': f'Bearer {access_token}'},
-                timeout=3
-            ).json()
+            response = await fetch_profile("naver", access_token)
 
-            user, created = User.objects.get_or_create(
-                naver = response['response']['id']
-            )
+            user_id, created = await sync_to_async(resolve_user)("naver", response['response']['id'])
             
-            token = jwt.encode({'id' : user.id}, SECRET_KEY, algorithm = ALGORITHMS)
+            token = jwt.encode({'id' : user_id}, SECRET_KEY, algorithm = ALGORITHMS)
 
             return JsonResponse({
                 'MESSAGE'      : 'SUCCESS',
@@ -125,6 +126,9 @@ class NaverLoginView(View):
         except KeyError:
             return JsonResponse({'MESSAGE' : 'KEY_ERROR'}, status=400)
 
+        except httpx.HTTPError:
+            return JsonResponse({'MESSAGE' : 'PROVIDER_UNAVAILABLE'}, status=502)
+
 class NicknameView(View):
     @login_decorator
     def post(self, request):
@@ -145,60 +149,38 @@ class NicknameView(View):
 
 class MyProfileView(View):
     @login_decorator
+    @method_decorator(condition(etag_func=profile_etag))
     def get(self, request):
-        user = request.user
-        data = Profile(user)
+        if "section" in request.GET:
+            return profile_section_response(request, request.user.id)
+
+        data = profile(request.user.id)
         return JsonResponse({'MESSAGE' : data}, status = 200)
 
 class OtherProfileView(View):
     @login_decorator
+    @method_decorator(condition(etag_func=profile_etag))
     def get(self, request, user_id):
-        if not User.objects.filter(id = user_id).exists():
+        if "section" in request.GET:
+            if not User.objects.filter(id = user_id).exists():
+                return JsonResponse({'MESSAGE' : 'NOT_FOUND_USER'}, status = 400)
+            return profile_section_response(request, user_id)
+
+        data = profile(user_id)
+        if data is None:
             return JsonResponse({'MESSAGE' : 'NOT_FOUND_USER'}, status = 400)
- 
-        user = User.objects.get(id = user_id)
-        data = Profile(user)
-        data["is_editable"] = True if user == request.user else False
+
+        data["is_editable"] = True if user_id == request.user.id else False
         return JsonResponse({"MESSAGE" : data}, status = 200)
-    
-def Profile(user):
-        data = {
-            "namecard" : {
-                "image"              : user.image,
-                "name"               : user.name,
-                "slogan"             : user.slogan,
-                "introduce"          : user.introduce,
-                "email"              : user.email,
-                "location"           : user.location,
-                "works"              : [{
-                    "year"     : history.year,
-                    "title"    : history.title,
-                    "subtitle" : history.subtitle
-                } for history in History.objects.filter(user = user)]},
-            "bookmarks"          : [{
-                "gallery_name"  : bookmark.gallery.name,
-                "gallery_image" : bookmark.gallery.image
-            } for bookmark in Bookmark.objects.select_related("gallery").filter(user = user)],
-            "postings"           : [{
-                "gallery_id" : posting.gallery.id,
-                "id"         : posting.id,
-                "title"      : posting.title,
-                "content"    : posting.content,
-                "created_at" : posting.created_at
-            } for posting in Posting.objects.filter(user = user).select_related("gallery")],
-            "likes"              : [{
-                "gallery_id" : like.posting.gallery.id,
-                "id"         : like.posting.id,
-                "title"      : like.posting.title,
-                "content"    : like.posting.content,
-                "created_at" : like.posting.created_at
-            } for like in Like.objects.filter(user = user).select_related("posting")],
-            "commented_postings" : [{
-                "gallery_id" : comment.posting.gallery.id,
-                "id"         : comment.posting.id,
-                "title"      : comment.posting.title,
-                "content"    : comment.posting.content,
-                "created_at" : comment.posting.created_at
-            } for comment in Comment.objects.filter(user = user).select_related("posting")]
-        }
-        return data
\ No newline at end of file
+
+def profile_section_response(request, user_id):
+    section = request.GET["section"]
+    if section not in SECTIONS:
+        return JsonResponse({'MESSAGE' : 'INVALID_SECTION'}, status = 400)
+
+    try:
+        rows, next_cursor = profile_section(user_id, section, request.GET.get("cursor", ""))
+    except InvalidCursor:
+        return JsonResponse({'MESSAGE' : 'INVALID_CURSOR'}, status = 400)
+
+    return JsonResponse({'MESSAGE' : rows, 'IS_NEXT' : next_cursor is not None, 'NEXT_CURSOR' : next_cursor}, status = 200)